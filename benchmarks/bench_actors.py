@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""actor-vs-actor contacts: cells broad phase vs. spritecollide
+
+    $ python3 benchmarks/bench_actors.py
+"""
+
+import os
+import random
+import sys
+from timeit import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import main  # noqa: E402
+from main import BLOCK_WIDTH, BLOCK_HEIGHT, ShiftableSpriteGroup  # noqa: E402
+
+TICKS = 30
+
+
+def make_actors(count):
+    """crowd of enemies on open square field"""
+    side = int(count ** .5) + 1
+    group = ShiftableSpriteGroup()
+    for i in range(count):
+        group.add(main.Enemy(i % side * BLOCK_WIDTH * 2,
+                             i // side * BLOCK_HEIGHT * 2))
+    return group
+
+
+def run(count, seed=1):
+    """simulate TICKS ticks, returns final positions"""
+    random.seed(seed)
+    group = make_actors(count)
+    groups = (ShiftableSpriteGroup(static=True),
+              ShiftableSpriteGroup(static=True),
+              group)
+    for _ in range(TICKS):
+        # zero time step keeps animations (and sprites sheet) out of it
+        group.update(0, groups)
+    return [spr.rect.topleft for spr in group]
+
+
+def main_bench():
+    print(f"{'actors':>7} {'scan, ms/tick':>14} {'grid, ms/tick':>14}")
+    for count in (10, 100, 300, 1000):
+        main.ACTORS_BROAD_PHASE = False
+        expected = run(count)
+        scan = timeit(lambda: run(count), number=1)
+        main.ACTORS_BROAD_PHASE = True
+        assert run(count) == expected
+        grid = timeit(lambda: run(count), number=1)
+        print(f"{count:>7} {scan / TICKS * 1e3:>14.2f} "
+              f"{grid / TICKS * 1e3:>14.2f}")
+
+
+if __name__ == "__main__":
+    main_bench()
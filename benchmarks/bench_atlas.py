@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""sprites atlas loading: eager tiles vs. subsurface views
+(with and without prepared sheets cache), time and resident memory.
+Every measurement runs in a fresh process
+
+    $ python3 benchmarks/bench_atlas.py
+"""
+
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.chdir(os.path.join(os.path.dirname(__file__), '..'))
+
+import pygame as pg  # noqa: E402
+import main  # noqa: E402
+
+MODES = "eager", "views", "views+cache"
+
+
+def measure(mode, cache_dir):
+    """prints load seconds, first draw seconds
+    and resident memory growth in KiB"""
+    pg.display.init()
+    screen = pg.display.set_mode(main.DISPLAY)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = default_timer()
+    atlas = main.SpritesAtlas(main.SPRITES_FILENAME, 22, 14,
+                              colorkey=pg.Color("#388700"),
+                              views=mode != "eager",
+                              cache_dir=cache_dir
+                              if mode == "views+cache" else None)
+    loaded = default_timer()
+    for row in atlas.sprites_tile:
+        for image in row:
+            screen.blit(image, (0, 0))
+    drawn = default_timer()
+    grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+    print(loaded - started, drawn - loaded, grown)
+
+
+def main_bench():
+    cache_dir = tempfile.mkdtemp()
+    try:
+        # warm up cache
+        subprocess.run([sys.executable, __file__, "--measure",
+                        "views+cache", cache_dir],
+                       capture_output=True, check=True)
+        print(f"{'':>12} {'load, ms':>9} {'1st draw, ms':>13} {'MiB':>6}")
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, __file__, "--measure", mode, cache_dir],
+                capture_output=True, text=True, check=True).stdout
+            loaded, drawn, grown = output.split()[-3:]
+            print(f"{mode:>12} {float(loaded) * 1e3:>9.1f} "
+                  f"{float(drawn) * 1e3:>13.1f} {int(grown) / 1024:>6.1f}")
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        measure(sys.argv[2], sys.argv[3])
+    else:
+        main_bench()
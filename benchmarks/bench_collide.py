@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Actor.collide: tile lookups vs. sprite.spritecollide over all blocks
+
+    $ python3 benchmarks/bench_collide.py
+"""
+
+import os
+import sys
+from timeit import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pygame import sprite  # noqa: E402
+import pygame as pg  # noqa: E402
+import main  # noqa: E402
+from main import BLOCK_WIDTH, BLOCK_HEIGHT, ShiftableSpriteGroup  # noqa: E402
+
+
+def make_blocks(size):
+    """walls of main.make_level() field"""
+    group = ShiftableSpriteGroup(static=True)
+    for row, line in enumerate(main.make_level(size, size).split('\n')):
+        for column, cell in enumerate(line):
+            if cell == '#':
+                spr = sprite.Sprite()
+                spr.rect = pg.Rect(column * BLOCK_WIDTH, row * BLOCK_HEIGHT,
+                                   BLOCK_WIDTH, BLOCK_HEIGHT)
+                group.add(spr)
+    return group
+
+
+def run(actor, groups, positions):
+    """push actor out of the walls from every position"""
+    results = []
+    for x, y in positions:
+        actor.rect.topleft = x, y
+        actor.collide(groups)
+        results.append(actor.rect.topleft)
+    return results
+
+
+def main_bench():
+    actor = main.Actor(0, 0)
+    positions = [(x, y)
+                 for x in range(BLOCK_WIDTH, BLOCK_WIDTH * 8, 3)
+                 for y in range(BLOCK_HEIGHT, BLOCK_HEIGHT * 8, 5)]
+    print(f"{'field':>9} {'sprites':>8} {'scan, us':>10} {'tiles, us':>10}")
+    for size in (31, 101, 201, 501):
+        groups = (make_blocks(size), ShiftableSpriteGroup(static=True))
+        main.TILE_COLLISIONS = False
+        expected = run(actor, groups, positions)
+        scan = timeit(lambda: run(actor, groups, positions), number=1)
+        main.TILE_COLLISIONS = True
+        assert run(actor, groups, positions) == expected
+        tiles = timeit(lambda: run(actor, groups, positions), number=1)
+        print(f"{size:>4}x{size:<4} {len(groups[0]):>8} "
+              f"{scan / len(positions) * 1e6:>10.2f} "
+              f"{tiles / len(positions) * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""ShiftableSpriteGroup.draw: culled batch vs. blitting every sprite
+
+    $ python3 benchmarks/bench_draw.py
+"""
+
+import os
+import sys
+from timeit import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pygame as pg  # noqa: E402
+from pygame import sprite  # noqa: E402
+from main import BLOCK_WIDTH, BLOCK_HEIGHT, DISPLAY  # noqa: E402
+from main import ShiftableSpriteGroup  # noqa: E402
+
+FRAMES = 20
+
+
+def draw_all(group, surface):
+    """former ShiftableSpriteGroup.draw"""
+    for spr in group.sprites():
+        rect = spr.rect.copy()
+        rect.x += group.view_shift[0]
+        rect.y += group.view_shift[1]
+        group.spritedict[spr] = surface.blit(spr.image, rect)
+
+
+def make_group(size):
+    """sprite on every other cell of size*size field"""
+    image = pg.Surface((BLOCK_WIDTH, BLOCK_HEIGHT))
+    group = ShiftableSpriteGroup()
+    for row in range(0, size, 2):
+        for column in range(0, size, 2):
+            spr = sprite.Sprite()
+            spr.image = image
+            spr.rect = pg.Rect(column * BLOCK_WIDTH, row * BLOCK_HEIGHT,
+                               BLOCK_WIDTH, BLOCK_HEIGHT)
+            group.add(spr)
+    return group
+
+
+def main_bench():
+    surface = pg.Surface(DISPLAY)
+    print(f"{'field':>9} {'sprites':>8} {'all, ms':>9} {'culled, ms':>11}")
+    for size in (31, 101, 201, 501):
+        group = make_group(size)
+        group.set_view_shift(-size * BLOCK_WIDTH // 2,
+                             -size * BLOCK_HEIGHT // 2)
+        full = timeit(lambda: draw_all(group, surface), number=FRAMES)
+        culled = timeit(lambda: group.draw(surface), number=FRAMES)
+        print(f"{size:>4}x{size:<4} {len(group):>8} "
+              f"{full / FRAMES * 1e3:>9.2f} {culled / FRAMES * 1e3:>11.2f}")
+
+
+if __name__ == "__main__":
+    main_bench()
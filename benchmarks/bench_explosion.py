@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""radius-30 Explosion animation: allocations and GC runs,
+pooled death-rays vs. former per-step sprites rebuilding
+
+    $ python3 benchmarks/bench_explosion.py
+"""
+
+import gc
+import os
+import sys
+import tracemalloc
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.chdir(os.path.join(os.path.dirname(__file__), '..'))
+
+import pygame as pg  # noqa: E402
+from pygame import sprite  # noqa: E402
+import main  # noqa: E402
+from main import BLOCK_WIDTH, BLOCK_HEIGHT  # noqa: E402
+
+RADIUS = 30
+STEP = 1000 // 25
+
+
+class LegacyExplosion(main.Explosion):
+    """Explosion with former update(): new sprites for every step"""
+    def update(self, time):
+        self.time += time
+        if not self.anim_center:
+            self.splash_group.empty()
+            self.kill()
+            return
+        if self.time / 1000 >= 1 / self.blast_speed:
+            self.time = 0
+            self.image = self.anim_center.pop()
+            images_otter = self.images_otter.pop()
+            images_inner = self.images_inner.pop()
+            self.splash_group.empty()
+            for i, (x, y) in enumerate(self.rays_directions):
+                for l in range(self.rays_lengths[i]):
+                    ray_sprite = sprite.Sprite()
+                    ray_sprite.image = images_inner[i]
+                    ray_sprite.rect = pg.Rect(
+                                        self.rect.x + x * l * BLOCK_WIDTH,
+                                        self.rect.y + y * l * BLOCK_HEIGHT,
+                                        BLOCK_WIDTH,
+                                        BLOCK_HEIGHT)
+                    self.splash_group.add(ray_sprite)
+                ray_end_sprite = sprite.Sprite()
+                ray_end_sprite.image = images_otter[i]
+                ray_end_sprite.rect = pg.Rect(
+                                    self.rect.x + x * (l + 1) * BLOCK_WIDTH,
+                                    self.rect.y + y * (l + 1) * BLOCK_HEIGHT,
+                                    BLOCK_WIDTH,
+                                    BLOCK_HEIGHT)
+                self.splash_group.add(ray_end_sprite)
+
+
+def run(cls, sprites_tile):
+    """whole animation of a single explosion on the empty field"""
+    explosion = cls(RADIUS * BLOCK_WIDTH, RADIUS * BLOCK_HEIGHT,
+                    sprites_tile=sprites_tile, radius=RADIUS)
+    explosion.set_blocking_groups(())
+    while not explosion.fired():
+        explosion.update(STEP)
+    explosion.update(STEP)
+
+
+def measure(cls, sprites_tile, repeat=20):
+    """ms per blast, GC runs per blast and peak of traced memory"""
+    collections = [0]
+
+    def on_gc(phase, info):
+        if phase == "start":
+            collections[0] += 1
+
+    gc.collect()
+    gc.callbacks.append(on_gc)
+    tracemalloc.start()
+    started = default_timer()
+    for _ in range(repeat):
+        run(cls, sprites_tile)
+    elapsed = default_timer() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.callbacks.remove(on_gc)
+    return elapsed / repeat * 1e3, collections[0] / repeat, peak
+
+
+def main_bench():
+    pg.mixer.init()
+    tile = pg.Surface((BLOCK_WIDTH, BLOCK_HEIGHT))
+    sprites_tile = [[tile] * 14 for _ in range(22)]
+    print(f"{'':>10} {'ms/blast':>9} {'GC runs':>8} {'peak, KiB':>10}")
+    for name, cls in (("rebuild", LegacyExplosion),
+                      ("pooled", main.Explosion)):
+        elapsed, collections, peak = measure(cls, sprites_tile)
+        print(f"{name:>10} {elapsed:>9.2f} {collections:>8.1f} "
+              f"{peak / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""get_sprite_in_pos: cells index vs. linear scan of the group
+
+    $ python3 benchmarks/bench_grid_index.py
+"""
+
+import os
+import sys
+from timeit import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pygame import sprite  # noqa: E402
+import pygame as pg  # noqa: E402
+from main import BLOCK_WIDTH, BLOCK_HEIGHT, ShiftableSpriteGroup  # noqa: E402
+
+
+def linear_get_sprite_in_pos(group, x, y):
+    """former implementation of ShiftableSpriteGroup.get_sprite_in_pos"""
+    for spr in group:
+        if spr.rect.x == x and spr.rect.y == y:
+            return spr
+
+
+def make_group(size):
+    """walls on every odd*odd cell of size*size field"""
+    group = ShiftableSpriteGroup()
+    for row in range(size):
+        for column in range(size):
+            if column % 2 and row % 2:
+                spr = sprite.Sprite()
+                spr.rect = pg.Rect(column * BLOCK_WIDTH, row * BLOCK_HEIGHT,
+                                   BLOCK_WIDTH, BLOCK_HEIGHT)
+                group.add(spr)
+    return group
+
+
+def main():
+    lookups = 1000
+    print(f"{'field':>9} {'sprites':>8} {'scan, us':>10} {'index, us':>10}")
+    for size in (31, 101, 201, 501):
+        group = make_group(size)
+        points = [((i * 7) % size * BLOCK_WIDTH,
+                   (i * 13) % size * BLOCK_HEIGHT)
+                  for i in range(lookups)]
+        scan = timeit(lambda: [linear_get_sprite_in_pos(group, x, y)
+                               for x, y in points], number=1)
+        index = timeit(lambda: [group.get_sprite_in_pos(x, y)
+                                for x, y in points], number=1)
+        print(f"{size:>4}x{size:<4} {len(group):>8} "
+              f"{scan / lookups * 1e6:>10.2f} {index / lookups * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""headless World: simulated seconds per wall-clock second
+
+    $ python3 benchmarks/bench_headless.py
+"""
+
+import os
+import random
+import sys
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import main  # noqa: E402
+
+TICK = 1000 // 30
+TICKS = 3000
+
+
+def run(field, seed=1):
+    """random walking and bombing player, returns wall-clock seconds"""
+    random.seed(seed)
+    world = main.World(field)
+    started = default_timer()
+    for tick in range(TICKS):
+        world.step(TICK, main.Controls(random.randint(-1, 1),
+                                       random.randint(-1, 1),
+                                       not tick % 50))
+    return default_timer() - started
+
+
+def main_bench():
+    print(f"{'field':>12} {'ticks/s':>9} {'sim s/s':>8}")
+    for name, field in (("DEMO_FIELD", main.DEMO_FIELD),
+                        ("31x31", main.make_level(31, 31)),
+                        ("101x101", main.make_level(101, 101))):
+        elapsed = run(field)
+        print(f"{name:>12} {TICKS / elapsed:>9.0f} "
+              f"{TICKS * TICK / 1000 / elapsed:>8.0f}")
+
+
+if __name__ == "__main__":
+    main_bench()
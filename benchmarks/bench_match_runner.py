@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""match runner: matches per second by workers count (scaling)
+
+    $ python3 benchmarks/bench_match_runner.py [matches count]
+"""
+
+import os
+import sys
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import match_runner  # noqa: E402
+
+
+def run(count, workers):
+    matches = list(match_runner.make_matches(count, seed=1, max_ticks=900))
+    started = default_timer()
+    results = list(match_runner.run_matches(matches, workers=workers))
+    assert len(results) == count
+    return count / (default_timer() - started)
+
+
+def main_bench():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    workers = 1
+    single = None
+    print(f"{'workers':>7} {'matches/s':>10} {'speedup':>8}")
+    while workers <= os.cpu_count():
+        rate = run(count, workers)
+        single = single or rate
+        print(f"{workers:>7} {rate:>10.1f} {rate / single:>8.2f}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main_bench()
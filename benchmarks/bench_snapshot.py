@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""World snapshots for look-ahead search: microseconds per operation
+and expanded nodes (restore, step, snapshot) per second
+
+    $ python3 benchmarks/bench_snapshot.py
+"""
+
+import os
+import random
+import sys
+from timeit import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import main  # noqa: E402
+
+TICK = 1000 // 30
+NUMBER = 2000
+
+
+def make_world(field, seed=1):
+    """world in the middle of a game: walking player and a bomb"""
+    world = main.World(field, seed=seed)
+    for tick in range(60):
+        world.step(TICK, main.Controls(1, 0, tick == 3))
+    return world
+
+
+def check_state_events(field):
+    """get_state() -> set_state() keeps events counters (dying bricks
+    are restored without being destroyed again)"""
+    world = main.World(field, seed=1)
+    for tick in range(300):
+        world.step(TICK, main.Controls(1, 0, tick % 10 == 3))
+        if world.blocks_group.dying:
+            break
+    state = world.get_state()
+    world.set_state(state)
+    assert dict(world.events.counts) == state["events"]
+
+
+def run(field):
+    world = make_world(field)
+    snapshot = world.snapshot()
+    state = world.get_state()
+    rng = random.Random(1)
+
+    def expand():
+        world.restore(snapshot)
+        world.step(TICK, main.Controls(rng.randint(-1, 1),
+                                       rng.randint(-1, 1),
+                                       False))
+        world.snapshot()
+
+    return (len(world.actors_group),
+            timeit(world.snapshot, number=NUMBER) / NUMBER * 1e6,
+            timeit(lambda: world.restore(snapshot),
+                   number=NUMBER) / NUMBER * 1e6,
+            timeit(world.clone, number=NUMBER // 10) / NUMBER * 10 * 1e6,
+            timeit(world.get_state, number=NUMBER // 10) / NUMBER * 10 * 1e6,
+            timeit(lambda: world.set_state(state),
+                   number=NUMBER // 10) / NUMBER * 10 * 1e6,
+            NUMBER / timeit(expand, number=NUMBER))
+
+
+def main_bench():
+    print(f"{'field':>12} {'actors':>6} {'snap us':>8} {'restore':>8} "
+          f"{'clone':>8} {'get_st':>8} {'set_st':>8} {'nodes/s':>8}")
+    for name, field in (("15x15+3", main.make_level(15, 15)
+                         .replace('_', 'b', 3)),
+                        ("DEMO_FIELD", main.DEMO_FIELD),
+                        ("101x101", main.make_level(101, 101))):
+        check_state_events(field)
+        actors, *times, nodes = run(field)
+        print(f"{name:>12} {actors:>6} " +
+              " ".join(f"{value:>8.1f}" for value in times) +
+              f" {nodes:>8.0f}")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""time from main() call to the first game frame:
+loose media files vs. assets bundle.
+Every launch runs in a fresh process with SDL dummy drivers
+
+    $ python3 benchmarks/bench_startup.py
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.chdir(os.path.join(os.path.dirname(__file__), '..'))
+
+import pygame as pg  # noqa: E402
+import main  # noqa: E402
+
+LAUNCHES = 5
+
+
+def use_existing_sounds():
+    """sounds absent in the checkout are replaced by the step sound"""
+    for name in ("SOUND_THEME", "SOUND_WIN", "SOUND_FAIL",
+                 "SOUND_STEP", "SOUND_PLANT", "SOUND_BLAST"):
+        if not os.path.exists(getattr(main, name)):
+            setattr(main, name, main.SOUND_STEP)
+
+
+def launch(bundle, cache_dir):
+    """prints seconds from main.main() call to the first game frame"""
+    use_existing_sounds()
+    main.BUNDLE_FILENAME = bundle
+    main.REPLAY_RECORD = False
+    main.ATLAS_CACHE_DIR = cache_dir if cache_dir != "-" else None
+    get_camera_shift = main.get_camera_shift
+
+    def first_frame(*args, **kwargs):
+        print(default_timer() - started)
+        raise SystemExit
+
+    def camera_shift(*args, **kwargs):
+        # the game frame is drawn, splash screen ones are not counted
+        pg.display.update = first_frame
+        return get_camera_shift(*args, **kwargs)
+
+    main.get_camera_shift = camera_shift
+    started = default_timer()
+    main.main()
+
+
+def build_bundle(filename):
+    use_existing_sounds()
+    pg.display.init()
+    pg.display.set_mode((1, 1))
+    pg.mixer.init(44100, 16, 2)
+    main.AssetBundle.build(filename, (main.SPRITES_FILENAME,
+                                      main.SPLASH_SPRITES_FILENAME),
+                           sorted({main.SOUND_THEME, main.SOUND_WIN,
+                                   main.SOUND_FAIL, main.SOUND_STEP,
+                                   main.SOUND_PLANT, main.SOUND_BLAST}),
+                           width=14 * main.BLOCK_WIDTH)
+
+
+def main_bench():
+    directory = tempfile.mkdtemp()
+    bundle = os.path.join(directory, "assets.bundle")
+    cache_dir = os.path.join(directory, "cache")
+    try:
+        subprocess.run([sys.executable, __file__, "--build", bundle],
+                       capture_output=True, check=True)
+        paths = (("loose files", "-", "-"),
+                 ("loose + cache", "-", cache_dir),
+                 ("bundle", bundle, "-"))
+        print(f"{'':>14} {'first frame, ms':>16}")
+        for name, bundle_filename, cache in paths:
+            times = []
+            for _ in range(LAUNCHES):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--launch",
+                     bundle_filename, cache],
+                    capture_output=True, text=True, check=True).stdout
+                times.append(float(output.split()[-1]))
+            print(f"{name:>14} {min(times) * 1e3:>16.1f}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--launch"]:
+        launch(sys.argv[2], sys.argv[3])
+    elif sys.argv[1:2] == ["--build"]:
+        build_bundle(sys.argv[2])
+    else:
+        main_bench()
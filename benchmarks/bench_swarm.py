@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""enemies simulated per millisecond by World() with Enemy() sprites
+and by SwarmWorld() with numpy arrays (whole World.step() timed)
+
+    $ python3 benchmarks/bench_swarm.py
+"""
+
+import os
+import random
+import sys
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import main  # noqa: E402
+import swarm  # noqa: E402
+
+TICK = 1000 // 30
+# enemies ticks simulated by every measure
+ENEMIES_TICKS = 200000
+WARMUP_TICKS = 5
+# enemies pushing each other: a train, a head-on pair, a vertical pair
+# and two enemies moved onto one cell, with (xvel, yvel) of every enemy
+CROWDED_FIELD = """\
+#############
+#P__________#
+#___bbb_bb_b#
+#__________b#
+#_bb________#
+#############"""
+CROWDED_VELOCITIES = ((1, 0), (1, 0), (1, 0), (1, 0), (-1, 0), (0, 1),
+                      (0, -1), (1, 0), (0, -1))
+
+
+def make_field(count, seed=1):
+    """level with about a quarter of empty cells taken by enemies"""
+    size = int((count * 8) ** .5) | 1
+    return main.place_enemies(main.make_level(size, size),
+                              ("bodr" * count)[:count], random.Random(seed))
+
+
+def check_contacts():
+    """enemies of the swarm push each other like Enemy() sprites
+    (one tick of the crowded field, no random numbers taken)"""
+    world = main.World(CROWDED_FIELD, seed=1)
+    swarm_world = swarm.SwarmWorld(CROWDED_FIELD, seed=1)
+    enemies = [actor for actor in world.actors_group
+               if isinstance(actor, main.Enemy)]
+    shift = main.MOVE_SPEED * 2 - main.BLOCK_WIDTH
+    enemies[-1].rect.x += shift
+    world.actors_group.index_sprite(enemies[-1])
+    swarm_world.swarm.x[-1] += shift
+    for index, (enemy, (xvel, yvel)) in enumerate(zip(enemies,
+                                                      CROWDED_VELOCITIES)):
+        enemy.xvel = swarm_world.swarm.xvel[index] = xvel
+        enemy.yvel = swarm_world.swarm.yvel[index] = yvel
+    controls = main.Controls(0, 0, False)
+    world.step(TICK, controls)
+    swarm_world.step(TICK, controls)
+    expected = [(enemy.rect.x, enemy.rect.y, enemy.xvel, enemy.yvel)
+                for enemy in enemies]
+    found = list(zip(*(getattr(swarm_world.swarm, name).tolist()
+                       for name in ("x", "y", "xvel", "yvel"))))
+    assert found == expected, (found, expected)
+
+
+def run(world_class, field):
+    """returns enemies per millisecond and milliseconds per tick"""
+    world = world_class(field, seed=1)
+    controls = main.Controls(0, 0, False)
+    for _ in range(WARMUP_TICKS):
+        world.step(TICK, controls)
+    enemies = len(world.swarm) if world_class is swarm.SwarmWorld \
+        else len(world.actors_group) - 1
+    ticks = max(3, ENEMIES_TICKS // enemies)
+    started = default_timer()
+    for _ in range(ticks):
+        world.step(TICK, controls)
+    elapsed = (default_timer() - started) * 1000
+    return enemies * ticks / elapsed, elapsed / ticks
+
+
+def main_bench():
+    check_contacts()
+    print(f"{'enemies':>8} {'sprites/ms':>11} {'ms/tick':>8} "
+          f"{'swarm/ms':>9} {'ms/tick':>8} {'speedup':>8}")
+    for count in (100, 1000, 5000, 20000):
+        field = make_field(count)
+        sprites_rate, sprites_tick = run(main.World, field)
+        swarm_rate, swarm_tick = run(swarm.SwarmWorld, field)
+        print(f"{count:>8} {sprites_rate:>11.0f} {sprites_tick:>8.2f} "
+              f"{swarm_rate:>9.0f} {swarm_tick:>8.2f} "
+              f"{swarm_rate / sprites_rate:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main_bench()
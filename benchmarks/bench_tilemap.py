@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""static field: TileMap() vs. sprite per block, memory and build time.
+Every measurement runs in a fresh process
+
+    $ python3 benchmarks/bench_tilemap.py [sizes...]
+"""
+
+import os
+import random
+import resource
+import subprocess
+import sys
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pygame as pg  # noqa: E402
+import main  # noqa: E402
+from main import BLOCK_WIDTH, BLOCK_HEIGHT  # noqa: E402
+
+SIZES = 31, 101, 201, 501
+
+
+def build_sprites(field, sprites_tile):
+    """former field model: sprite for every wall and brick"""
+    group = main.ShiftableSpriteGroup(static=True)
+    for y, row in enumerate(field.split('\n')):
+        for x, cell in enumerate(row):
+            if cell == '#':
+                group.add(main.WallBlock(x * BLOCK_WIDTH, y * BLOCK_HEIGHT,
+                                         sprites_tile=sprites_tile))
+            elif cell == '_' and not random.randint(
+                                        0, main.BLOCKS_PROBABILITY):
+                group.add(main.BrickBlock(x * BLOCK_WIDTH, y * BLOCK_HEIGHT,
+                                          sprites_tile=sprites_tile))
+    return group
+
+
+def build_tilemap(field, sprites_tile):
+    rows = field.split('\n')
+    tilemap = main.TileMap(len(rows[0]), len(rows), sprites_tile)
+    for y, row in enumerate(rows):
+        for x, cell in enumerate(row):
+            if cell == '#':
+                tilemap.set_kind(x, y, main.TILE_WALL)
+            elif cell == '_' and not random.randint(
+                                        0, main.BLOCKS_PROBABILITY):
+                tilemap.set_kind(x, y, main.TILE_BRICK)
+    return tilemap
+
+
+def measure(model, size):
+    """prints build seconds and resident memory growth in KiB"""
+    random.seed(size)
+    tile = pg.Surface((BLOCK_WIDTH, BLOCK_HEIGHT))
+    sprites_tile = [[tile] * 14 for _ in range(22)]
+    field = main.make_level(size, size)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = default_timer()
+    field_model = {"sprites": build_sprites,
+                   "tilemap": build_tilemap}[model](field, sprites_tile)
+    elapsed = default_timer() - started
+    grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+    print(elapsed, grown, len(field_model))
+
+
+def main_bench(sizes):
+    print(f"{'field':>9} {'blocks':>8} "
+          f"{'sprites, s':>11} {'MiB':>7} {'tilemap, s':>11} {'MiB':>7}")
+    for size in sizes:
+        line = f"{size:>4}x{size:<4}"
+        for model in ("sprites", "tilemap"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--measure", model, str(size)],
+                capture_output=True, text=True, check=True).stdout
+            elapsed, grown, blocks = output.split()[-3:]
+            if model == "sprites":
+                line += f" {int(blocks):>8}"
+            line += f" {float(elapsed):>11.3f} {int(grown) / 1024:>7.1f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        measure(sys.argv[2], int(sys.argv[3]))
+    else:
+        main_bench([int(size) for size in sys.argv[1:]] or SIZES)
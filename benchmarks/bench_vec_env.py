@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""VecEnv: env-steps per second of N games stepped in lockstep
+with random actions (auto-reset included).
+Target: 10-20k env-steps/s on 15x15 fields without enemies on one core,
+measured numbers are in README.md
+
+    $ python3 benchmarks/bench_vec_env.py
+"""
+
+import os
+import sys
+from timeit import default_timer
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import vec_env  # noqa: E402
+
+ENV_STEPS = 20000
+
+
+def run(count, width, enemies, seed=1):
+    """returns env-steps per second of steps and of observations only"""
+    envs = vec_env.VecEnv(count, width=width, height=width,
+                          enemies=enemies, seed=seed)
+    envs.reset()
+    rng = np.random.default_rng(seed)
+    steps = max(1, ENV_STEPS // count)
+    actions = np.stack([rng.integers(-1, 2, (steps, count)),
+                        rng.integers(-1, 2, (steps, count)),
+                        rng.random((steps, count)) < .02], axis=2)
+    started = default_timer()
+    for step in range(steps):
+        envs.step(actions[step])
+    elapsed = default_timer() - started
+    started = default_timer()
+    for step in range(steps):
+        envs.observe()
+    observe_elapsed = default_timer() - started
+    return steps * count / elapsed, steps * count / observe_elapsed
+
+
+def main_bench():
+    print(f"{'envs':>5} {'field':>7} {'enemies':>7} "
+          f"{'steps/s':>9} {'observe/s':>10}")
+    for count in (1, 16, 256):
+        for width, enemies in ((15, 0), (15, 3), (31, 10)):
+            steps, observations = run(count, width, enemies)
+            print(f"{count:>5} {f'{width}x{width}':>7} {enemies:>7} "
+                  f"{steps:>9.0f} {observations:>10.0f}")
+
+
+if __name__ == "__main__":
+    main_bench()
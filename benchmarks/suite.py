@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""game loop benchmark suite: seeded scripted scenarios
+played headlessly (SDL dummy video and audio drivers)
+with per-tick percentiles of every subsystem written into json file,
+and comparison of two such files
+
+    $ python3 benchmarks/suite.py run [-o results.json] [scenarios...]
+    $ python3 benchmarks/suite.py compare base.json new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+from datetime import datetime
+from time import perf_counter
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pygame as pg  # noqa: E402
+import main  # noqa: E402
+
+# "clone" is World.clone() after the tick, out of the tick time
+STAGES = ("input", "player", "groups", "blast", "draw", "present", "tick",
+          "clone")
+PERCENTILES = 50, 90, 99
+TICKS = 300
+SEED = 1
+# relative growth of a percentile counted as regression
+THRESHOLD = .10
+# smaller differences in milliseconds are noise
+MIN_DIFFERENCE = .05
+
+
+def make_enemies_field(count):
+    """field big enough for count enemies"""
+    size = 31 if count <= 10 else 63 if count <= 100 else 101
+    return main.place_enemies(main.make_level(size, size),
+                              "bodr" * (count // 4) + "bodr"[:count % 4],
+                              random.Random(SEED))
+
+
+def add_chain(world, count=50, radius=30):
+    """count bombs of radius on every other cell of odd rows,
+    the first one detonates in a second and sets off the rest"""
+    bombs = 0
+    for row in range(1, world.blocks_group.rows - 1, 2):
+        for column in range(3, world.blocks_group.columns - 1, 2):
+            if bombs == count:
+                break
+            if world.blocks_group.get_kind(column, row):
+                world.blocks_group.set_kind(column, row, main.TILE_EMPTY)
+            world.add_bomb(main.Bomb(column * main.BLOCK_WIDTH,
+                                     row * main.BLOCK_HEIGHT,
+                                     world.sprites_tile,
+                                     timer=1 if not bombs else 60,
+                                     radius=radius))
+            bombs += 1
+
+
+# name: (field maker, world preparation)
+SCENARIOS = {
+    "demo": (lambda: main.DEMO_FIELD, None),
+    "level_31": (lambda: main.make_level(31, 31), None),
+    "level_101": (lambda: main.make_level(101, 101), None),
+    "level_201": (lambda: main.make_level(201, 201), None),
+    "level_501": (lambda: main.make_level(501, 501), None),
+    "enemies_10": (lambda: make_enemies_field(10), None),
+    "enemies_100": (lambda: make_enemies_field(100), None),
+    "enemies_1000": (lambda: make_enemies_field(1000), None),
+    "chain_50": (lambda: main.make_level(101, 101), add_chain),
+}
+
+
+def make_script(ticks, seed):
+    """key events of every tick: random walk, a bomb every 50 ticks"""
+    rng = random.Random(seed)
+    keys = pg.K_LEFT, pg.K_RIGHT, pg.K_UP, pg.K_DOWN
+    script = []
+    key = None
+    for tick in range(ticks):
+        events = []
+        if not tick % 20:
+            if key is not None:
+                events.append(pg.event.Event(pg.KEYUP, key=key, mod=0))
+            key = rng.choice(keys)
+            events.append(pg.event.Event(pg.KEYDOWN, key=key, mod=0))
+        if tick % 50 == 49:
+            events.append(pg.event.Event(pg.KEYDOWN, key=pg.K_SPACE, mod=0))
+        script.append(events)
+    return script
+
+
+class Stopwatch:
+    """milliseconds of stages of the current tick,
+    wrapped functions add theirs time to the stage"""
+    def __init__(self):
+        self.tick = dict.fromkeys(STAGES, 0.)
+        self.ticks = {stage: [] for stage in STAGES}
+
+    def wrap(self, stage, function, when=None):
+        """function measured into the stage (if when(kwargs) is true)"""
+        tick = self.tick
+
+        def wrapper(*args, **kwargs):
+            if when is not None and not when(kwargs):
+                return function(*args, **kwargs)
+            started = perf_counter()
+            result = function(*args, **kwargs)
+            tick[stage] += (perf_counter() - started) * 1e3
+            return result
+        return wrapper
+
+    def add(self, stage, started):
+        self.tick[stage] += (perf_counter() - started) * 1e3
+
+    def next_tick(self):
+        for stage in STAGES:
+            self.ticks[stage].append(self.tick[stage])
+            self.tick[stage] = 0.
+
+
+def instrument(world, stopwatch):
+    """measure subsystems of World.step() without changes of the game:
+    entry points are wrapped on the world instances and main module"""
+    player = world.player
+    player.update = stopwatch.wrap("player", player.update,
+                                   lambda kwargs: kwargs.get("directcall"))
+    for group in (world.blocks_group, world.bombs_group,
+                  world.explosions_group, world.actors_group):
+        group.update = stopwatch.wrap("groups", group.update)
+    originals = {}
+    for name in ("make_blast_map", "explode_blast_map",
+                 "resolve_chain_reaction"):
+        originals[name] = getattr(main, name)
+        setattr(main, name, stopwatch.wrap("blast", originals[name]))
+    return originals
+
+
+def get_percentiles(values):
+    values = sorted(values)
+    result = {f"p{percentile}":
+              values[min(len(values) - 1,
+                         round(percentile / 100 * (len(values) - 1)))]
+              for percentile in PERCENTILES}
+    result["max"] = values[-1]
+    result["mean"] = sum(values) / len(values)
+    return result
+
+
+def run_scenario(name, screen, sprites_tile, ticks=TICKS, seed=SEED):
+    """returns per-tick percentiles of stages in milliseconds"""
+    make_field, prepare = SCENARIOS[name]
+    world = main.World(make_field(), sprites_tile, seed=seed)
+    if prepare:
+        prepare(world)
+    background = pg.Surface(screen.get_size())
+    background.fill(pg.Color(main.BACKGROUND_COLOR))
+    stopwatch = Stopwatch()
+    originals = instrument(world, stopwatch)
+    script = make_script(ticks, seed)
+    horizontal = vertical = 0
+    try:
+        for events in script:
+            tick_started = started = perf_counter()
+            for event in events:
+                pg.event.post(event)
+            action = False
+            for event in pg.event.get():
+                if event.type == pg.KEYDOWN:
+                    if event.key == pg.K_LEFT:
+                        horizontal = -1
+                    elif event.key == pg.K_RIGHT:
+                        horizontal = 1
+                    elif event.key == pg.K_UP:
+                        vertical = -1
+                    elif event.key == pg.K_DOWN:
+                        vertical = 1
+                    elif event.key == pg.K_SPACE:
+                        action = True
+                elif event.type == pg.KEYUP:
+                    if event.key in (pg.K_LEFT, pg.K_RIGHT):
+                        horizontal = 0
+                    else:
+                        vertical = 0
+            controls = main.Controls(horizontal, vertical, action)
+            stopwatch.add("input", started)
+
+            world.step(main.TICK_TIME, controls)
+
+            started = perf_counter()
+            cam_shift = main.get_camera_shift(world, *screen.get_size())
+            groups = [explosion.get_splash_group()
+                      for explosion in world.explosions_group]
+            groups += [world.blocks_group, world.bombs_group,
+                       world.explosions_group, world.actors_group]
+            screen.blit(background, (0, 0))
+            for group in groups:
+                group.set_view_shift(*cam_shift)
+                group.draw(screen)
+            stopwatch.add("draw", started)
+
+            started = perf_counter()
+            pg.display.update()
+            stopwatch.add("present", started)
+            stopwatch.add("tick", tick_started)
+
+            started = perf_counter()
+            world.clone()
+            stopwatch.add("clone", started)
+            stopwatch.next_tick()
+    finally:
+        for function_name, function in originals.items():
+            setattr(main, function_name, function)
+    return {stage: get_percentiles(values)
+            for stage, values in stopwatch.ticks.items()}
+
+
+def run(args):
+    output = os.path.abspath(args.output)
+    # media paths are relative to the game directory
+    os.chdir(os.path.join(os.path.dirname(__file__), '..'))
+    pg.init()
+    pg.mixer.init(44100, 16, 2)
+    screen = pg.display.set_mode(main.DISPLAY)
+    sprites_tile = main.SpriteSheet(
+        main.SPRITES_FILENAME, width=14 * main.BLOCK_WIDTH).view_table(
+            (0, 0, main.BLOCK_WIDTH, main.BLOCK_HEIGHT), 22, 14,
+            colorkey=pg.Color("#388700"))
+    results = {"meta": {"date": datetime.now().isoformat(timespec="seconds"),
+                        "python": platform.python_version(),
+                        "pygame": pg.version.ver,
+                        "machine": platform.machine(),
+                        "ticks": args.ticks,
+                        "seed": args.seed},
+               "scenarios": {}}
+    for name in args.scenarios or SCENARIOS:
+        started = perf_counter()
+        stages = results["scenarios"][name] = run_scenario(
+            name, screen, sprites_tile, args.ticks, args.seed)
+        print(f"{name:>14} {perf_counter() - started:>6.1f}s  " +
+              " ".join(f"{stage} {stages[stage]['p50']:.3f}"
+                       for stage in STAGES), file=sys.stderr)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=1)
+    print("Results are written:", output, file=sys.stderr)
+
+
+def compare(args):
+    """prints changes of percentiles, returns 1 if any regression"""
+    with open(args.base) as file:
+        base = json.load(file)["scenarios"]
+    with open(args.new) as file:
+        new = json.load(file)["scenarios"]
+    regressions = 0
+    print(f"{'scenario':>14} {'stage':>8} {'value':>5} "
+          f"{'base ms':>9} {'new ms':>9} {'change':>8}")
+    for name in base:
+        if name not in new:
+            continue
+        for stage in STAGES:
+            if stage not in base[name] or stage not in new[name]:
+                continue
+            for value in args.values.split(","):
+                old = base[name][stage][value]
+                current = new[name][stage][value]
+                change = (current - old) / old if old else 0.
+                flag = ""
+                if change > args.threshold and \
+                        current - old > MIN_DIFFERENCE:
+                    flag = "REGRESSION"
+                    regressions += 1
+                elif -change > args.threshold and \
+                        old - current > MIN_DIFFERENCE:
+                    flag = "improvement"
+                print(f"{name:>14} {stage:>8} {value:>5} {old:>9.3f} "
+                      f"{current:>9.3f} {change:>+8.1%} {flag}")
+    print(f"{regressions} regressions")
+    return 1 if regressions else 0
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run scenarios")
+    run_parser.add_argument("scenarios", nargs="*",
+                            help=f"some of: {', '.join(SCENARIOS)}")
+    run_parser.add_argument("-o", "--output", default="bench_results.json")
+    run_parser.add_argument("--ticks", type=int, default=TICKS)
+    run_parser.add_argument("--seed", type=int, default=SEED)
+    compare_parser = commands.add_parser("compare",
+                                         help="flag regressions")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float,
+                                default=THRESHOLD)
+    compare_parser.add_argument("--values", default="p50,p90",
+                                help="compared percentiles")
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main_bench()
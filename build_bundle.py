@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""packs prepared sprites sheets and decoded sounds
+into main.BUNDLE_FILENAME for faster startup
+
+    $ python3 build_bundle.py
+"""
+
+import os
+
+import pygame as pg
+import main
+
+
+def build():
+    pg.display.init()
+    pg.display.set_mode((1, 1), pg.HIDDEN)
+    # the same mixer format as in main.main()
+    pg.mixer.init(44100, 16, 2)
+    sounds = []
+    for filename in (main.SOUND_THEME, main.SOUND_WIN, main.SOUND_FAIL,
+                     main.SOUND_STEP, main.SOUND_PLANT, main.SOUND_BLAST):
+        if os.path.exists(filename):
+            sounds.append(filename)
+        else:
+            print('Sound is not found, skipped:', filename)
+    main.AssetBundle.build(main.BUNDLE_FILENAME,
+                           (main.SPRITES_FILENAME,
+                            main.SPLASH_SPRITES_FILENAME),
+                           sounds,
+                           width=14 * main.BLOCK_WIDTH)
+    print('Bundle is written:', main.BUNDLE_FILENAME)
+
+
+if __name__ == "__main__":
+    build()
@@ -1,10 +1,28 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import atexit
+import base64
+import copy
+import gc
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+import threading
+import zlib
 import pygame as pg
 from pygame import sprite
-from itertools import cycle
+from array import array
+from collections import deque, namedtuple
+from datetime import datetime
+from functools import wraps
+from heapq import heapify, heappop, heappush
+from itertools import count, cycle
 from random import randint
+from time import perf_counter
 
 # for field
 BLOCK_WIDTH = 32
@@ -23,6 +41,16 @@ COLOR = "#888888"
 ANIMATION_RATE = 10
 
 SPRITES_FILENAME = './media/sprites_mq.png'
+# the smallest sheet is enough for splash screen animation
+SPLASH_SPRITES_FILENAME = './media/sprites_lq.png'
+FRAME_BUDGET = 1000 / 30
+# slice atlases as subsurfaces of one sheet instead of separate surfaces
+ATLAS_VIEWS = True
+# directory for prepared (converted and scaled) sheets, None - no caching
+ATLAS_CACHE_DIR = './media/cache'
+# prepared sheets and decoded sounds packed by build_bundle.py,
+# loose files are loaded if it is absent
+BUNDLE_FILENAME = './media/assets.bundle'
 
 SOUND_THEME = "./media/sfx_1.wav"
 SOUND_WIN = "./media/sfx_6.wav"
@@ -31,8 +59,60 @@ SOUND_STEP = "./media/sfx_5.wav"
 SOUND_PLANT = "./media/sfx_3.wav"
 SOUND_BLAST = "./media/sfx_4.wav"
 
+# mixer channels shared by all sounds
+SOUND_CHANNELS = 16
+# sounds categories: (priority, maximum of simultaneous voices)
+# voice of lower or same priority is stolen when all channels are busy
+SOUND_CATEGORIES = {
+    "music": (3, 2),
+    "blast": (2, 6),
+    "plant": (1, 4),
+    "step": (0, 1),
+}
+
 BLOCKS_PROBABILITY = 3
 
+# kinds of TileMap() cells
+TILE_EMPTY = 0
+TILE_WALL = 1
+TILE_BRICK = 2
+# TileMap() layer is pre-rendered by squares of LAYER_CHUNK*LAYER_CHUNK cells
+LAYER_CHUNK = 16
+LAYER_CHUNKS_CACHED = 64
+
+# look up static obstacles by overlapped tiles instead of testing them all
+TILE_COLLISIONS = True
+# look up moving actors by nearby cells instead of testing them all
+ACTORS_BROAD_PHASE = True
+# redraw and present only changed parts of the screen while camera stays
+DIRTY_RECTS = True
+# advance World() by fixed steps of TICK_TIME milliseconds, not by frame time
+FIXED_TIMESTEP = True
+TICK_TIME = 1000 // 30
+# fixed steps per frame at most, the rest of lag is dropped
+MAX_TICKS_PER_FRAME = 5
+# record sessions (fixed timestep only) into REPLAY_DIR
+REPLAY_RECORD = True
+REPLAY_DIR = './replays'
+# ticks between world keyframes of replay for seeking
+REPLAY_KEYFRAME_TICKS = 300
+# ticks skipped by one seeking key press while playing back
+REPLAY_SEEK_TICKS = 300
+# profiler of frames stages and hot methods, toggled by PROFILE_KEY
+PROFILE = False
+PROFILE_KEY = pg.K_F3
+PROFILE_OVERLAY_POSITION = (8, 8)
+# frames of rolling values on the overlay
+PROFILE_WINDOW = 30
+# the last frames samples dumped into PROFILE_DIR on over budget frame
+PROFILE_DUMPS = True
+PROFILE_RING_FRAMES = 300
+PROFILE_DIR = './profiles'
+# milliseconds between links of bombs chain reaction, 0 - all at once
+CHAIN_REACTION_DELAY = TICK_TIME
+# cells of the player flow field for enemies AI, farther ones wander
+FLOW_FIELD_RADIUS = 24
+
 DEMO_FIELD = """#############################
                 #P+B__________#_____ror_____#
                 #+#_#_#_#_#b#_#_#_#_#_#_#_#_#
@@ -75,18 +155,109 @@ def make_level(width, height):
     return '\n'.join(level_base)
 
 
+def place_enemies(field, enemies, rng):
+    """field with enemies (string of theirs field chars, e.g. "bbod")
+    put on random empty cells out of 4x4 corner of the player start"""
+    rows = [list(row.strip()) for row in field.split('\n')]
+    cells = [(x, y) for y, row in enumerate(rows) for x, cell in enumerate(row)
+             if cell == '_' and (x >= 4 or y >= 4)]
+    for (x, y), enemy in zip(rng.sample(cells, min(len(enemies), len(cells))),
+                             enemies):
+        rows[y][x] = enemy
+    return '\n'.join(''.join(row) for row in rows)
+
+
+# kinds of World() events
+EVENT_BRICK_DESTROYED = "brick destroyed"
+EVENT_ENEMY_DIED = "enemy died"
+EVENT_BOMB_ARMED = "bomb armed"
+EVENT_BOMB_DETONATED = "bomb detonated"
+EVENT_PLAYER_DIED = "player died"
+EVENTS = (EVENT_BRICK_DESTROYED, EVENT_ENEMY_DIED, EVENT_BOMB_ARMED,
+          EVENT_BOMB_DETONATED, EVENT_PLAYER_DIED)
+
+
 def get_closer_center(x, y):
     """returns closer block coordinates for place objects"""
     return round(x / BLOCK_WIDTH) * BLOCK_WIDTH, \
         round(y / BLOCK_HEIGHT) * BLOCK_HEIGHT
 
 
+class Animation:
+    """endless frames loop like itertools.cycle()
+    with position to be saved and restored"""
+    __slots__ = ("frames", "position")
+
+    def __init__(self, frames, position=0):
+        self.frames = list(frames)
+        self.position = position
+
+    def __copy__(self):
+        """frames are never changed, so copies share them"""
+        clone = Animation.__new__(Animation)
+        clone.frames = self.frames
+        clone.position = self.position
+        return clone
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.frames:
+            raise StopIteration
+        frame = self.frames[self.position]
+        self.position = (self.position + 1) % len(self.frames)
+        return frame
+
+
+def get_animations_state(spr):
+    """positions of Animation() attributes of the sprite"""
+    return {name: value.position for name, value in vars(spr).items()
+            if isinstance(value, Animation)}
+
+
+def encode_image(image, images_cells):
+    """sprites table cell of the image for a state"""
+    return images_cells.get(image) if image is not None else None
+
+
+def decode_image(cell, sprites_tile):
+    if cell is None:
+        return None
+    row, column = cell
+    return sprites_tile[row][column]
+
+
+# copy functions of sprites attributes types copied by clone_sprite()
+CLONED_TYPES = {list: list.copy,
+                pg.Rect: pg.Rect.copy,
+                Animation: Animation.__copy__}
+
+
+def clone_sprite(spr):
+    """copy of the sprite out of groups with own rect, lists and animations
+    (shared ones stay shared), images are not copied"""
+    cls = type(spr)
+    clone = cls.__new__(cls)
+    attributes = vars(clone)
+    attributes.update(vars(spr))
+    sprite.Sprite.__init__(clone)
+    copies = {}
+    for name, value in vars(spr).items():
+        copy_value = CLONED_TYPES.get(type(value))
+        if copy_value:
+            if id(value) not in copies:
+                copies[id(value)] = copy_value(value)
+            attributes[name] = copies[id(value)]
+    return clone
+
+
 class Block(sprite.Sprite):
     """abstract class for static objects"""
     def __init__(self, x, y, sprites_tile=None):
         super().__init__()
-        self.image = pg.Surface((BLOCK_WIDTH, BLOCK_HEIGHT))
-        self.image.fill(pg.Color(BLOCK_COLOR))
+        # subclasses set theirs own images
+        self.image = None
         self.rect = pg.Rect(x, y, BLOCK_WIDTH, BLOCK_HEIGHT)
         self.alive = True
 
@@ -131,6 +302,9 @@ class BrickBlock(Block):
 
 class Bomb(Block):
     """bomb class for placing by Player()"""
+    # EventBus() of the world, World() gives its own one to every bomb
+    events = None
+
     def __init__(self, x, y, sprites_tile, timer=1, radius=1):
         super().__init__(x, y)
         self.sprites_tile = sprites_tile
@@ -139,14 +313,18 @@ class Bomb(Block):
         self.radius = radius
         self.animation_rate = ANIMATION_RATE / (self.countdown + .55)
         self.animation_timeout = 0
-        self.anim_static = cycle(sprites_tile[3][0:3] +
-                                 sprites_tile[3][2:-1:-1])
+        self.anim_static = Animation(sprites_tile[3][0:3] +
+                                     sprites_tile[3][2:-1:-1])
         self.anim_die = sprites_tile[3][5:11]
-        self.sfx_plant = pg.mixer.Sound(SOUND_PLANT)
-        self.sfx_plant.play()
+        # turned into delayed Explosion(), stays on the field till the blast
+        self.detonated = False
+        self.sfx_plant = SOUNDS.play(SOUND_PLANT, "plant")
 
     def update(self, time):
         """tick-tock-tick-tock~"""
+        if self.detonated:
+            # frozen in the image of its Explosion() till the blast
+            return
         self.animation_timeout += time
         self.countdown -= time / 1000
         self.animation_rate = ANIMATION_RATE / (self.countdown + .5)
@@ -160,13 +338,57 @@ class Bomb(Block):
     def get_epicenter(self):
         return self.rect.x, self.rect.y
 
-    def get_explosion(self):
+    def snapshot(self):
+        """values of changing attributes for World().snapshot()"""
+        return (self.countdown, self.alive, self.detonated,
+                self.animation_rate, self.animation_timeout,
+                self.anim_static.position, self.image)
+
+    def restore(self, values):
+        self.countdown, self.alive, self.detonated, self.animation_rate, \
+            self.animation_timeout, self.anim_static.position, \
+            self.image = values
+
+    def get_state(self, images_cells):
+        """plain values of the bomb for World().get_state()"""
+        return {"x": self.rect.x,
+                "y": self.rect.y,
+                "countdown": self.countdown,
+                "radius": self.radius,
+                "alive": self.alive,
+                "detonated": self.detonated,
+                "animation_rate": self.animation_rate,
+                "animation_timeout": self.animation_timeout,
+                "animations": get_animations_state(self),
+                "image": encode_image(self.image, images_cells)}
+
+    @classmethod
+    def from_state(cls, state, sprites_tile):
+        bomb = cls(state["x"], state["y"], sprites_tile,
+                   timer=state["countdown"], radius=state["radius"])
+        bomb.alive = state["alive"]
+        bomb.detonated = state.get("detonated", False)
+        bomb.animation_rate = state["animation_rate"]
+        bomb.animation_timeout = state["animation_timeout"]
+        bomb.anim_static.position = state["animations"]["anim_static"]
+        bomb.image = decode_image(state["image"], sprites_tile)
+        return bomb
+
+    def get_explosion(self, delay=0):
         """replacing himsef on field with Explosion()"""
         self.sfx_plant.fadeout(25)
         self.kill()
-        return Explosion(*self.get_epicenter(),
-                         sprites_tile=self.sprites_tile,
-                         radius=self.radius)
+        if self.events:
+            self.events.emit(EVENT_BOMB_DETONATED, self)
+        explosion = Explosion(*self.get_epicenter(),
+                              sprites_tile=self.sprites_tile,
+                              radius=self.radius,
+                              delay=delay)
+        if delay:
+            # still looks like a bomb until the blast
+            explosion.image = self.image
+            self.detonated = True
+        return explosion
 
 
 class Explosion(Block):
@@ -181,6 +403,9 @@ class Explosion(Block):
             self.radius = kwargs["radius"]
         self.rays_lengths = [self.radius] * 4
 
+        # milliseconds before the blast begins
+        self.delay = kwargs.get("delay", 0)
+
         self.blast_speed = 25
         self.time = 0
 
@@ -192,6 +417,7 @@ class Explosion(Block):
         self.rays_directions = ((-1, 0), (+1, 0), (0, -1), (0, +1))
 
         self.blocking_groups = set()
+        self.rays_sprites = None
 
         self.anim_center = [kwargs["sprites_tile"][6][2],
                             kwargs["sprites_tile"][6][7],
@@ -203,11 +429,16 @@ class Explosion(Block):
 
         self.anim_center, self.images_inner, self.images_otter = \
             self.get_rays_images(kwargs["sprites_tile"])
+        # all frames are kept for restoring of snapshots
+        self.frames = tuple(zip(self.anim_center,
+                                self.images_inner,
+                                self.images_otter))
 
         self.splash_group = ShiftableSpriteGroup()
 
-        self.sfx_blast = pg.mixer.Sound(SOUND_BLAST)
-        self.sfx_blast.play()
+        self.sfx_blast = Voice()
+        if not self.delay:
+            self.sfx_blast = SOUNDS.play(SOUND_BLAST, "blast")
 
     def set_blocking_groups(self, groups):
         self.blocking_groups = groups
@@ -239,10 +470,19 @@ class Explosion(Block):
 
         return images_center, images_inner, images_otter
 
-    def update(self, time, interact_with=None):
-        self.time += time
+    def update(self, time):
+        if self.delay > 0:
+            self.delay -= time
+            if self.delay <= 0:
+                self.sfx_blast = SOUNDS.play(SOUND_BLAST, "blast")
+                # the bomb blocked its cell till the blast
+                for group in self.blocking_groups:
+                    bomb = group.get_sprite_in_pos(*self.rect.topleft)
+                    if isinstance(bomb, Bomb) and bomb.detonated:
+                        bomb.kill()
+            return
 
-        self.collide(interact_with)
+        self.time += time
 
         if not self.anim_center:
             self.image = self.static_image
@@ -253,74 +493,138 @@ class Explosion(Block):
 
         if self.time / 1000 >= 1 / self.blast_speed:
             self.time = 0
-            self.image = self.anim_center.pop()
-
-            images_otter = self.images_otter.pop()
-            images_inner = self.images_inner.pop()
+            self.next_frame()
 
-            self.splash_group.empty()
-
-            # making death-rays of a predicted length
-            for i, (x, y) in enumerate(self.rays_directions):
-                for l in range(self.rays_lengths[i]):
-                    ray_sprite = sprite.Sprite()
-                    ray_sprite.image = images_inner[i]
-                    # ray_sprite.mask = pg.mask.from_surface(ray_sprite.image)
+    def next_frame(self):
+        """shows next frame of the blast with death-rays"""
+        self.image = self.anim_center.pop()
 
-                    ray_sprite.rect = pg.Rect(
-                                        self.rect.x + x * l * BLOCK_WIDTH,
-                                        self.rect.y + y * l * BLOCK_HEIGHT,
-                                        BLOCK_WIDTH,
-                                        BLOCK_HEIGHT)
-                    self.splash_group.add(ray_sprite)
+        images_otter = self.images_otter.pop()
+        images_inner = self.images_inner.pop()
 
-                ray_end_sprite = sprite.Sprite()
-                ray_end_sprite.image = images_otter[i]
-                # ray_end_sprite.mask = pg.mask.from_surface(
-                #                                    ray_end_sprite.image)
+        if not self.splash_group:
+            self.splash_group.add(*self.get_rays_sprites())
 
-                ray_end_sprite.rect = pg.Rect(
-                                    self.rect.x + x * (l + 1) * BLOCK_WIDTH,
-                                    self.rect.y + y * (l + 1) * BLOCK_HEIGHT,
-                                    BLOCK_WIDTH,
-                                    BLOCK_HEIGHT)
-                self.splash_group.add(ray_end_sprite)
+        # death-rays sprites are placed once, only images are changing
+        for i, ray in enumerate(self.rays_sprites):
+            for ray_sprite in ray:
+                ray_sprite.image = images_inner[i]
+            ray_sprite.image = images_otter[i]
 
     def get_splash_group(self):
         """returns ShiftableSpriteGroup() group of death-rays"""
         return self.splash_group
 
+    def get_splash_cells(self):
+        """returns set of field cells covered by death-rays"""
+        return set(self.splash_group.cells)
+
     def fired(self):
         """is explosion ends?"""
         return not self.anim_center
 
+    def snapshot(self):
+        """values of changing attributes for World().snapshot()"""
+        return self.delay, self.time, len(self.anim_center), self.image
+
+    def restore(self, values):
+        self.delay, self.time, frames_left, self.image = values
+        frames_count = len(self.frames)
+        if frames_left != len(self.anim_center):
+            frames = self.frames[:frames_left]
+            self.anim_center = [frame[0] for frame in frames]
+            self.images_inner = [frame[1] for frame in frames]
+            self.images_otter = [frame[2] for frame in frames]
+            if frames_left < frames_count:
+                # death-rays of the last shown frame
+                _, images_inner, images_otter = self.frames[frames_left]
+                for i, ray in enumerate(self.rays_sprites):
+                    for ray_sprite in ray:
+                        ray_sprite.image = images_inner[i]
+                    ray_sprite.image = images_otter[i]
+        if frames_left < frames_count and not self.splash_group:
+            self.splash_group.add(*self.get_rays_sprites())
+        elif frames_left == frames_count and self.splash_group:
+            self.splash_group.empty()
+
+    def clone(self, blocking_groups):
+        """copy of the explosion with own death-rays sprites"""
+        clone = clone_sprite(self)
+        clone.blocking_groups = blocking_groups
+        clone.rays_sprites = [[clone_sprite(ray_sprite) for ray_sprite in ray]
+                              for ray in self.rays_sprites]
+        clone.splash_group = ShiftableSpriteGroup()
+        if self.splash_group:
+            clone.splash_group.add(*clone.get_rays_sprites())
+        return clone
+
+    def get_state(self, images_cells):
+        """plain values of the explosion for World().get_state()"""
+        return {"x": self.rect.x,
+                "y": self.rect.y,
+                "radius": self.radius,
+                "rays_lengths": list(self.rays_lengths),
+                "delay": self.delay,
+                "time": self.time,
+                "frames_left": len(self.anim_center),
+                "image": encode_image(self.image, images_cells)}
+
+    @classmethod
+    def from_state(cls, state, sprites_tile, blocking_groups):
+        """explosion with the same frame and death-rays,
+        rays lengths are not clipped again"""
+        explosion = cls(state["x"], state["y"], sprites_tile=sprites_tile,
+                        radius=state["radius"], delay=state["delay"])
+        explosion.blocking_groups = blocking_groups
+        explosion.rays_lengths = list(state["rays_lengths"])
+        explosion.get_rays_sprites()
+        while len(explosion.anim_center) > state["frames_left"]:
+            explosion.next_frame()
+        explosion.time = state["time"]
+        explosion.image = decode_image(state["image"], sprites_tile)
+        return explosion
+
     def clip_rays_lengths(self):
         """calculate maximum rays lengths to sprites from collection of groups
-        returns tuple of distances (left, right, up, down)"""
-        for i in range(self.radius, 0, -1):
-            for group in self.blocking_groups:
-                for j, (x, y) in enumerate(self.rays_directions):
-                    if group.get_sprite_in_pos(
+        and places death-rays sprites of these lengths"""
+        for j, (x, y) in enumerate(self.rays_directions):
+            for i in range(1, self.radius + 1):
+                if any(group.has_sprite_in_pos(
                                 self.rect.x + i * x * BLOCK_WIDTH,
-                                self.rect.y + i * y * BLOCK_HEIGHT):
-                        self.rays_lengths[j] = i
-
-    def collide(self, list_of_sprites_group):
-        """processing of death-rays touching
-        by sprites in collection of groups"""
-        collisions = []
-        for sprites_group in list_of_sprites_group:
-            collisions += sprite.groupcollide(sprites_group,
-                                              self.splash_group,
-                                              False,
-                                              False)
-        for collision in collisions:
-            # trying to destroy collided sprites
-            collision.exploded()
+                                self.rect.y + i * y * BLOCK_HEIGHT)
+                       for group in self.blocking_groups):
+                    self.rays_lengths[j] = i
+                    break
+        self.rays_sprites = None
+        self.get_rays_sprites()
+
+    def get_rays_sprites(self):
+        """returns list of death-rays sprites of clipped lengths.
+        Sprites are made once, the last one of every ray is its end"""
+        if self.rays_sprites is None:
+            self.rays_sprites = []
+            for i, (x, y) in enumerate(self.rays_directions):
+                ray = []
+                for l in range(self.rays_lengths[i] + 1):
+                    ray_sprite = sprite.Sprite()
+                    ray_sprite.rect = pg.Rect(
+                                        self.rect.x + x * l * BLOCK_WIDTH,
+                                        self.rect.y + y * l * BLOCK_HEIGHT,
+                                        BLOCK_WIDTH,
+                                        BLOCK_HEIGHT)
+                    ray.append(ray_sprite)
+                self.rays_sprites.append(ray)
+        return [ray_sprite
+                for ray in self.rays_sprites
+                for ray_sprite in ray]
 
 
 class Actor(sprite.Sprite):
     """abstract class for moving objects"""
+    # EventBus() of the world, World() gives its own one to every actor
+    events = None
+    died_event = EVENT_ENEMY_DIED
+
     def __init__(self, x, y, sprites_tile=None):
         super().__init__()
         self.xvel = self.yvel = 0
@@ -335,9 +639,15 @@ class Actor(sprite.Sprite):
         self.rect = pg.Rect(x, y, WIDTH, HEIGHT)
         self.animation_timeout = 0
         self.alive = True
+        # distinct Animation() attributes and (name, index of animation)
+        # of all of them, found at the first snapshot or clone
+        self.animations = None
+        self.animations_slots = None
 
     def exploded(self):
         """death-ray of Explosion() touched here"""
+        if self.alive and self.events:
+            self.events.emit(self.died_event, self)
         self.alive = False
 
     def get_center_position(self):
@@ -345,28 +655,122 @@ class Actor(sprite.Sprite):
         return self.rect.x + self.rect.w // 2, \
             self.rect.y + self.rect.h // 2
 
+    def get_animations(self):
+        if self.animations is None:
+            indexes = {}
+            animations = []
+            slots = []
+            for name, value in vars(self).items():
+                if isinstance(value, Animation):
+                    if id(value) not in indexes:
+                        indexes[id(value)] = len(animations)
+                        animations.append(value)
+                    slots.append((name, indexes[id(value)]))
+            self.animations = tuple(animations)
+            self.animations_slots = tuple(slots)
+        return self.animations
+
+    def snapshot(self):
+        """values of changing attributes for World().snapshot()"""
+        return (self.rect.x, self.rect.y, self.xvel, self.yvel, self.alive,
+                self.animation_timeout, self.image,
+                [animation.position for animation in self.get_animations()],
+                None if self.anim_die is None else tuple(self.anim_die))
+
+    def restore(self, values):
+        self.rect.x, self.rect.y, self.xvel, self.yvel, self.alive, \
+            self.animation_timeout, self.image, positions, anim_die = values
+        for animation, position in zip(self.get_animations(), positions):
+            animation.position = position
+        if anim_die is not None and len(anim_die) != len(self.anim_die):
+            self.anim_die = list(anim_die)
+
+    def clone(self):
+        """clone_sprite() by known attributes: own rect, dying frames and
+        animations (shared ones stay shared), other values are shared"""
+        # slots are found before they are shared with the clone
+        animations = self.get_animations()
+        cls = type(self)
+        clone = cls.__new__(cls)
+        attributes = vars(clone)
+        attributes.update(vars(self))
+        sprite.Sprite.__init__(clone)
+        clone.rect = self.rect.copy()
+        if self.anim_die is not None:
+            clone.anim_die = list(self.anim_die)
+        animations = clone.animations = tuple(
+            [animation.__copy__() for animation in animations])
+        for name, index in self.animations_slots:
+            attributes[name] = animations[index]
+        return clone
+
+    def get_state(self, images_cells):
+        """plain values of the actor for World().get_state()"""
+        return {"class": type(self).__name__,
+                "x": self.rect.x,
+                "y": self.rect.y,
+                "xvel": self.xvel,
+                "yvel": self.yvel,
+                "alive": self.alive,
+                "animation_timeout": self.animation_timeout,
+                "animations": get_animations_state(self),
+                "anim_die": None if self.anim_die is None
+                else len(self.anim_die),
+                "image": encode_image(self.image, images_cells)}
+
+    @classmethod
+    def from_state(cls, state, sprites_tile):
+        actor = cls(state["x"], state["y"], sprites_tile=sprites_tile)
+        actor.xvel = state["xvel"]
+        actor.yvel = state["yvel"]
+        actor.alive = state["alive"]
+        actor.animation_timeout = state["animation_timeout"]
+        for name, position in state["animations"].items():
+            getattr(actor, name).position = position
+        if state["anim_die"] is not None:
+            # dying animations are popped from the end
+            del actor.anim_die[state["anim_die"]:]
+        actor.image = decode_image(state["image"], sprites_tile)
+        return actor
+
     def collide(self, list_of_sprites_group):
         """static objects collisions processing
-        moving through walls here"""
+        moving through walls here.
+        returns set of colliding sprites and (x, y) corners of colliding
+        tiles (no Tile() is made for them)"""
         move_h = move_v = 0
 
         collisions = set()
 
         for sprites_group in list_of_sprites_group:
 
-            collisions.update(sprite.spritecollide(self, sprites_group, False))
+            if hasattr(sprites_group, "get_corners_in_rect") and \
+                    TILE_COLLISIONS:
+                collisions.update(
+                    sprites_group.get_corners_in_rect(self.rect))
+            elif hasattr(sprites_group, "get_sprites_in_rect") and \
+                    (TILE_COLLISIONS if sprites_group.static
+                     else ACTORS_BROAD_PHASE):
+                collisions.update(sprites_group.get_sprites_in_rect(self.rect))
+            else:
+                collisions.update(
+                    sprite.spritecollide(self, sprites_group, False))
             collisions.discard(self)
             for collision in collisions:
-                if collision.rect.x < self.rect.x:
+                if isinstance(collision, tuple):
+                    x, y = collision
+                else:
+                    x, y = collision.rect.topleft
+                if x < self.rect.x:
                     move_h += 1
 
-                if collision.rect.x > self.rect.x:
+                if x > self.rect.x:
                     move_h -= 1
 
-                if collision.rect.y < self.rect.y:
+                if y < self.rect.y:
                     move_v += 1
 
-                if collision.rect.y > self.rect.y:
+                if y > self.rect.y:
                     move_v -= 1
 
         if move_h > 0:
@@ -383,24 +787,26 @@ class Actor(sprite.Sprite):
 
 class Player(Actor):
     """main character class"""
+    died_event = EVENT_PLAYER_DIED
+
     def __init__(self, x, y, sprites_tile=None):
         super().__init__(x, y)
         self.sprites_tile = sprites_tile
         if sprites_tile:
             self.image = self.static_image = sprites_tile[0][4]
-            self.anim_right = cycle(sprites_tile[1][0:3])
-            self.anim_left = cycle(sprites_tile[0][0:3])
-            self.anim_up = cycle(sprites_tile[1][3:6])
-            self.anim_down = cycle(sprites_tile[0][3:6])
+            self.anim_right = Animation(sprites_tile[1][0:3])
+            self.anim_left = Animation(sprites_tile[0][0:3])
+            self.anim_up = Animation(sprites_tile[1][3:6])
+            self.anim_down = Animation(sprites_tile[0][3:6])
             self.anim_die = sprites_tile[2][6::-1]
             self.anim_died = sprites_tile[20][:2] +\
                 sprites_tile[20][3:5] +\
                 sprites_tile[20][6:7]
-            self.anim_died = cycle(self.anim_died + self.anim_died[::-1])
+            self.anim_died = Animation(self.anim_died +
+                                       self.anim_died[::-1])
         self.bomb_timer = 3
         self.bomb_radius = 1
-        self.sfx_step = pg.mixer.Sound(SOUND_STEP)
-        self.sfx_step.set_volume(.50)
+        self.sfx_step = Voice()
         self.steps_count = 0
 
     def update(self,
@@ -442,7 +848,7 @@ class Player(Actor):
 
             if (self.xvel or self.yvel) and self.steps_count >= 2:
                 self.sfx_step.fadeout(50)
-                self.sfx_step.play()
+                self.sfx_step = SOUNDS.play(SOUND_STEP, "step", volume=.50)
                 self.steps_count = 0
             self.steps_count += 1
 
@@ -464,19 +870,89 @@ class Player(Actor):
         """draw himself onto the surface"""
         surface.blit(self.image, self.rect)
 
+    def snapshot(self):
+        return super().snapshot(), \
+            self.bomb_timer, self.bomb_radius, self.steps_count
+
+    def restore(self, values):
+        values, self.bomb_timer, self.bomb_radius, self.steps_count = values
+        super().restore(values)
+
+    def get_state(self, images_cells):
+        state = super().get_state(images_cells)
+        state.update(bomb_timer=self.bomb_timer,
+                     bomb_radius=self.bomb_radius,
+                     steps_count=self.steps_count)
+        return state
+
+    @classmethod
+    def from_state(cls, state, sprites_tile):
+        player = super().from_state(state, sprites_tile)
+        player.bomb_timer = state["bomb_timer"]
+        player.bomb_radius = state["bomb_radius"]
+        player.steps_count = state["steps_count"]
+        return player
+
     def is_alive(self):
         """check sprite not collided with death-ray from Explosion()"""
         return self.alive
 
 
 class Enemy(Actor):
-    """enemy abstract class"""
+    """enemy abstract class, wanders randomly.
+    Subclasses may chase the player and flee bombs blasts
+    by FlowField() of the world at every field cell they pass"""
+    # random numbers generator, World() gives its own one to every enemy
+    rng = random
+    # FlowField() of the world, World() gives the same one to every enemy
+    flow_field = None
+    chases = False
+    flees = False
+
+    def get_flow_direction(self):
+        """(xvel, yvel) by the flow field at the field cell:
+        the current direction while it is good, else a random good one"""
+        flow_field = self.flow_field
+        column, row = get_cell(self.rect.x, self.rect.y)
+        moves = [(dx, dy) for dx, dy in FlowField.directions
+                 if flow_field.is_passable(column + dx, row + dy)]
+        if self.flees:
+            safe_moves = [(dx, dy) for dx, dy in moves
+                          if not flow_field.is_dangerous(column + dx,
+                                                         row + dy)]
+            if flow_field.is_dangerous(column, row):
+                # out of the blast, safe cells first
+                moves = safe_moves or moves
+            else:
+                moves = safe_moves
+        if self.chases:
+            distance = flow_field.get_distance(column, row)
+            if distance is not None:
+                closer_moves = [
+                    (dx, dy) for dx, dy in moves
+                    if flow_field.get_distance(column + dx, row + dy) ==
+                    distance - 1]
+                moves = closer_moves or moves
+        if not moves:
+            return 0, 0
+        if (self.xvel, self.yvel) in moves:
+            return self.xvel, self.yvel
+        return moves[self.rng.randint(0, len(moves) - 1)]
+
     def update(self, time, blocks):
-        if not self.xvel and not self.yvel:
-            if randint(0, 1):
-                self.xvel = randint(-1, 1)
+        direction = None
+        if self.alive and (self.chases or self.flees) and \
+                self.flow_field is not None and \
+                not self.rect.x % BLOCK_WIDTH and \
+                not self.rect.y % BLOCK_HEIGHT:
+            direction = self.get_flow_direction()
+        if direction is not None:
+            self.xvel, self.yvel = direction
+        elif not self.xvel and not self.yvel:
+            if self.rng.randint(0, 1):
+                self.xvel = self.rng.randint(-1, 1)
             else:
-                self.yvel = randint(-1, 1)
+                self.yvel = self.rng.randint(-1, 1)
 
         if not self.alive:
             self.xvel = self.yvel = 0
@@ -515,67 +991,133 @@ class Enemy(Actor):
 
 
 class Ballom(Enemy):
-    """Ballom enemy class"""
+    """Ballom enemy class, wanders"""
     def __init__(self, x, y, sprites_tile):
         super().__init__(x, y, sprites_tile)
         self.image = self.static_image = sprites_tile[15][0]
-        self.anim_right = cycle(sprites_tile[15][0:3])
-        self.anim_left = cycle(sprites_tile[15][3:6])
+        self.anim_right = Animation(sprites_tile[15][0:3])
+        self.anim_left = Animation(sprites_tile[15][3:6])
         self.anim_up = self.anim_left
         self.anim_down = self.anim_right
         self.anim_die = sprites_tile[15][10:5:-1]
 
 
 class Onil(Enemy):
-    """O'Neal enemy class"""
+    """O'Neal enemy class, chases the player"""
+    chases = True
+
     def __init__(self, x, y, sprites_tile):
         super().__init__(x, y, sprites_tile)
         self.image = self.static_image = sprites_tile[16][0]
-        self.anim_right = cycle(sprites_tile[16][0:3])
-        self.anim_left = cycle(sprites_tile[16][3:6])
+        self.anim_right = Animation(sprites_tile[16][0:3])
+        self.anim_left = Animation(sprites_tile[16][3:6])
         self.anim_up = self.anim_left
         self.anim_down = self.anim_right
         self.anim_die = sprites_tile[16][6:7] * 3
 
 
 class Dahl(Enemy):
-    """Dahl enemy class"""
+    """Dahl enemy class, wanders away from bombs"""
+    flees = True
+
     def __init__(self, x, y, sprites_tile):
         super().__init__(x, y, sprites_tile)
         self.image = self.static_image = sprites_tile[17][0]
-        self.anim_right = cycle(sprites_tile[17][0:3])
-        self.anim_left = cycle(sprites_tile[17][3:6])
+        self.anim_right = Animation(sprites_tile[17][0:3])
+        self.anim_left = Animation(sprites_tile[17][3:6])
         self.anim_up = self.anim_left
         self.anim_down = self.anim_right
         self.anim_die = sprites_tile[17][10:5:-1]
 
 
 class Doria(Enemy):
-    """Doria enemy class"""
+    """Doria enemy class, chases the player avoiding bombs"""
+    chases = True
+    flees = True
+
     def __init__(self, x, y, sprites_tile):
         super().__init__(x, y, sprites_tile)
         self.image = self.static_image = sprites_tile[19][0]
-        self.anim_right = cycle(sprites_tile[19][0:3])
-        self.anim_left = cycle(sprites_tile[19][3:6])
+        self.anim_right = Animation(sprites_tile[19][0:3])
+        self.anim_left = Animation(sprites_tile[19][3:6])
         self.anim_up = self.anim_left
         self.anim_down = self.anim_right
         self.anim_die = sprites_tile[18][10:6:-1] + sprites_tile[19][6:7]
 
 
 class SpriteSheet:
-    """single-file sprites loader class"""
-    def __init__(self, filename):
+    """single-file sprites loader class.
+    Sheet is scaled to width if it is given, prepared sheet
+    may be cached in cache_dir for next launches"""
+    def __init__(self, filename, width=None, cache_dir=None, bundle=None):
+        if bundle is not None:
+            self.sheet = bundle.get_sheet(filename, width)
+            if self.sheet is not None:
+                return
+        cache_filename = None
+        if cache_dir is not None:
+            cache_filename = self.get_cache_filename(filename, width,
+                                                     cache_dir)
+            self.sheet = self.load_cache(cache_filename)
+            if self.sheet is not None:
+                return
         try:
             self.sheet = pg.image.load(filename).convert()
         except pg.error as message:
             print('Unable to load spritesheet image:', filename)
             raise SystemExit(message)
-
-    def image_at(self, rectangle, colorkey=None):
-        """loads image from x, y, x + offset, y + offset"""
+        if width is not None and width != self.sheet.get_width():
+            height = self.sheet.get_height() * width // \
+                self.sheet.get_width()
+            self.sheet = pg.transform.scale(self.sheet, (width, height))
+        if cache_filename is not None:
+            self.save_cache(cache_filename)
+
+    @classmethod
+    def from_surface(cls, surface):
+        """wraps already loaded sheet"""
+        ss = cls.__new__(cls)
+        ss.sheet = surface
+        return ss
+
+    @staticmethod
+    def get_cache_filename(filename, width, cache_dir):
+        """cache is bound to modification time of the sheet file"""
+        name = os.path.splitext(os.path.basename(filename))[0]
+        mtime = os.stat(filename).st_mtime_ns
+        return os.path.join(cache_dir, f"{name}-{mtime}-{width}.rgbx")
+
+    @staticmethod
+    def load_cache(cache_filename):
+        """returns prepared sheet or None if it is not cached"""
+        try:
+            with open(cache_filename, 'rb') as cache:
+                width, height = struct.unpack('<II', cache.read(8))
+                pixels = cache.read()
+        except (OSError, struct.error):
+            return None
+        if len(pixels) != width * height * 4:
+            return None
+        return pg.image.fromstring(pixels, (width, height), 'RGBX').convert()
+
+    def save_cache(self, cache_filename):
+        """write prepared sheet, caching is optional so errors are ignored"""
+        try:
+            os.makedirs(os.path.dirname(cache_filename), exist_ok=True)
+            with open(cache_filename, 'wb') as cache:
+                cache.write(struct.pack('<II', *self.sheet.get_size()))
+                cache.write(pg.image.tostring(self.sheet, 'RGBX'))
+        except OSError:
+            pass
+
+    def image_at(self, rectangle, colorkey=None, size=None):
+        """loads image from x, y, x + offset, y + offset
+        scaled to size if it is given"""
         rect = pg.Rect(rectangle)
         image = pg.Surface(rect.size).convert()
         image.blit(self.sheet, (0, 0), rect)
+        if size is not None and tuple(size) != rect.size:
+            image = pg.transform.scale(image, size)
         if colorkey is None:
             colorkey = image.get_at((0, 0))
             image.set_colorkey(colorkey, pg.RLEACCEL)
@@ -583,9 +1125,9 @@ class SpriteSheet:
             image.set_colorkey(colorkey, pg.RLEACCEL)
         return image
 
-    def images_at(self, rects, colorkey=None):
+    def images_at(self, rects, colorkey=None, size=None):
         """loads multiple images, supply a list of coordinates"""
-        return [self.image_at(rect, colorkey) for rect in rects]
+        return [self.image_at(rect, colorkey, size) for rect in rects]
 
     def load_strip(self, rect, image_count, colorkey=None):
         """loads a strip of images and returns them as a list"""
@@ -593,7 +1135,7 @@ class SpriteSheet:
                 for x in range(image_count)]
         return self.images_at(tups, colorkey)
 
-    def load_table(self, rect, rows, cols, colorkey=None):
+    def load_table(self, rect, rows, cols, colorkey=None, size=None):
         """loads cols*rows of sprites"""
         ret = []
         for i in range(rows):
@@ -601,33 +1143,399 @@ class SpriteSheet:
                      rect[1] + rect[3] * i,
                      rect[2], rect[3])
                     for x in range(cols)]
-            ret.append(self.images_at(tups, colorkey))
+            ret.append(self.images_at(tups, colorkey, size))
         return ret
 
+    def view_at(self, rectangle, colorkey=None):
+        """returns subsurface of the sheet, no pixels are copied.
+        Colorkey is RLE encoded by SDL at the first drawing"""
+        image = self.sheet.subsurface(rectangle)
+        if colorkey is None:
+            colorkey = image.get_at((0, 0))
+        if isinstance(colorkey, pg.Color):
+            image.set_colorkey(colorkey, pg.RLEACCEL)
+        return image
+
+    def view_table(self, rect, rows, cols, colorkey=None):
+        """views of cols*rows of sprites, see view_at()"""
+        return [[self.view_at((rect[0] + rect[2] * x,
+                               rect[1] + rect[3] * i,
+                               rect[2], rect[3]), colorkey)
+                 for x in range(cols)]
+                for i in range(rows)]
+
+
+class SpritesAtlas:
+    """sprites table of the sheet scaled to the blocks size.
+    With views=True the sheet is scaled as a whole and sprites_tile
+    holds subsurfaces of it"""
+    def __init__(self, filename, rows, cols, colorkey,
+                 views=ATLAS_VIEWS, cache_dir=ATLAS_CACHE_DIR, bundle=None):
+        if views:
+            self.sheet = SpriteSheet(filename, width=cols * BLOCK_WIDTH,
+                                     cache_dir=cache_dir, bundle=bundle)
+            self.sprites_tile = self.sheet.view_table(
+                (0, 0, BLOCK_WIDTH, BLOCK_HEIGHT), rows, cols, colorkey)
+            return
+        ss = SpriteSheet(filename)
+        tile_width = ss.sheet.get_width() // cols
+        tile_height = tile_width * BLOCK_HEIGHT // BLOCK_WIDTH
+        self.sprites_tile = ss.load_table((0, 0, tile_width, tile_height),
+                                          rows, cols,
+                                          colorkey=colorkey,
+                                          size=(BLOCK_WIDTH, BLOCK_HEIGHT))
+
+
+class AssetBundle:
+    """memory-mapped file of prepared sprites sheets (raw RGBX pixels)
+    and sounds decoded to the mixer format (raw PCM).
+    Layout: MAGIC, uint32 length of JSON index, index, data blocks"""
+    MAGIC = b"DEXBNDL1"
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as bundle_file:
+            self.data = mmap.mmap(bundle_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        if self.data[:len(self.MAGIC)] != self.MAGIC:
+            raise ValueError(f"{filename} is not an assets bundle")
+        offset = len(self.MAGIC)
+        length, = struct.unpack_from('<I', self.data, offset)
+        offset += 4
+        self.index = json.loads(self.data[offset:offset + length])
+        self.data_offset = offset + length
+
+    def get_block(self, key, filename):
+        """(entry, data) of the block packed from the file, (None, None)
+        if it is not packed or the file is changed since packing"""
+        entry = self.index["blocks"].get(key)
+        if entry is None or not self.is_fresh(entry, filename):
+            return None, None
+        start = self.data_offset + entry["offset"]
+        return entry, memoryview(self.data)[start:start + entry["size"]]
+
+    def get_sheet(self, filename, width):
+        """returns prepared sheet surface or None if it is not packed"""
+        entry, pixels = self.get_block(f"sheet:{filename}:{width}",
+                                       filename)
+        if entry is None:
+            return None
+        return pg.image.frombuffer(pixels, entry["size_px"],
+                                   'RGBX').convert()
+
+    def get_sound(self, filename):
+        """returns pg.mixer.Sound or None if it is not packed
+        or packed for another mixer format"""
+        if list(pg.mixer.get_init() or ()) != self.index["mixer"]:
+            return None
+        entry, samples = self.get_block(f"sound:{filename}", filename)
+        if entry is None:
+            return None
+        return pg.mixer.Sound(buffer=samples)
+
+    @staticmethod
+    def get_source(filename):
+        """modification time and size of the packed file"""
+        stat = os.stat(filename)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    @classmethod
+    def is_fresh(cls, entry, filename):
+        """block is packed from the current file or the file is absent
+        (the bundle is the only source then)"""
+        try:
+            return entry.get("source") == cls.get_source(filename)
+        except OSError:
+            return True
+
+    @classmethod
+    def build(cls, filename, sheets, sounds, width):
+        """pack sheets scaled to width and sounds decoded by current
+        mixer, display and mixer must be initialized"""
+        blocks = {}
+        chunks = []
+        offset = 0
+
+        def add_block(key, data, **meta):
+            nonlocal offset
+            blocks[key] = dict(meta, offset=offset, size=len(data))
+            chunks.append(data)
+            offset += len(data)
+
+        for sheet_filename in sheets:
+            sheet = SpriteSheet(sheet_filename, width=width).sheet
+            add_block(f"sheet:{sheet_filename}:{width}",
+                      pg.image.tostring(sheet, 'RGBX'),
+                      size_px=sheet.get_size(),
+                      source=cls.get_source(sheet_filename))
+        for sound_filename in sounds:
+            add_block(f"sound:{sound_filename}",
+                      pg.mixer.Sound(sound_filename).get_raw(),
+                      source=cls.get_source(sound_filename))
+
+        index = json.dumps({"mixer": list(pg.mixer.get_init()),
+                            "blocks": blocks}).encode()
+        with open(filename, 'wb') as bundle_file:
+            bundle_file.write(cls.MAGIC)
+            bundle_file.write(struct.pack('<I', len(index)))
+            bundle_file.write(index)
+            for data in chunks:
+                bundle_file.write(data)
+
+
+def open_bundle():
+    """returns AssetBundle() or None if it is absent"""
+    if os.path.exists(BUNDLE_FILENAME):
+        return AssetBundle(BUNDLE_FILENAME)
+    return None
+
+
+def load_assets(assets, bundle=None):
+    """loads sounds and sprites atlas from the bundle or loose files,
+    runs in the background thread, results are stored into assets dict"""
+    try:
+        SOUNDS.preload(SOUND_THEME, SOUND_WIN, SOUND_FAIL,
+                       SOUND_STEP, SOUND_PLANT, SOUND_BLAST,
+                       bundle=bundle)
+        assets["atlas"] = SpritesAtlas(SPRITES_FILENAME, 22, 14,
+                                       colorkey=pg.Color("#388700"),
+                                       bundle=bundle)
+    except BaseException as error:
+        assets["error"] = error
+
+
+def get_cell(x, y):
+    """returns (column, row) of the field cell containing point x*y"""
+    return x // BLOCK_WIDTH, y // BLOCK_HEIGHT
+
+
+class Voice:
+    """handle of a sound played by SoundBank().
+    Does nothing once its channel is taken by another sound"""
+    def __init__(self, bank=None, channel=None, category=None, serial=0):
+        self.bank = bank
+        self.channel = channel
+        self.category = category
+        self.serial = serial
+
+    def is_playing(self):
+        return self.channel is not None and \
+            self.bank.voices.get(self.channel) is self and \
+            self.channel.get_busy()
+
+    def fadeout(self, time):
+        if self.is_playing():
+            self.channel.fadeout(time)
+
+    def stop(self):
+        if self.is_playing():
+            self.channel.stop()
+
+
+class SoundBank:
+    """decodes every sound file once and plays shared sounds
+    through fixed pool of mixer channels with categories priorities"""
+    def __init__(self, channels=SOUND_CHANNELS, categories=SOUND_CATEGORIES):
+        self.channels_count = channels
+        self.categories = categories
+        self.sounds = {}
+        self.channels = []
+        self.voices = {}
+        self.serial = 0
+        # nothing is played while world is restored or fast-forwarded
+        self.muted = False
+
+    def get_sound(self, filename):
+        """returns shared pg.mixer.Sound, loads file at first request"""
+        sound = self.sounds.get(filename)
+        if sound is None:
+            sound = self.sounds[filename] = pg.mixer.Sound(filename)
+        return sound
+
+    def preload(self, *filenames, bundle=None):
+        """decode sounds before they are needed,
+        already decoded ones are taken from bundle if it is given"""
+        for filename in filenames:
+            if filename not in self.sounds and bundle is not None:
+                sound = bundle.get_sound(filename)
+                if sound is not None:
+                    self.sounds[filename] = sound
+                    continue
+            self.get_sound(filename)
+
+    def get_channels(self):
+        if not self.channels:
+            pg.mixer.set_num_channels(self.channels_count)
+            self.channels = [pg.mixer.Channel(i)
+                             for i in range(self.channels_count)]
+        return self.channels
+
+    def get_channel(self, category):
+        """returns idle or stolen channel for the category voice
+        or None if all channels are playing more important sounds"""
+        for channel, voice in list(self.voices.items()):
+            if not channel.get_busy():
+                del self.voices[channel]
+
+        priority, budget = self.categories[category]
+        same = [voice for voice in self.voices.values()
+                if voice.category == category]
+        if len(same) >= budget:
+            victim = min(same, key=lambda voice: voice.serial)
+        else:
+            for channel in self.get_channels():
+                if channel not in self.voices:
+                    return channel
+            victim = min(self.voices.values(),
+                         key=lambda voice: (self.categories[voice.category][0],
+                                            voice.serial))
+            if self.categories[victim.category][0] > priority:
+                return None
+        victim.channel.stop()
+        del self.voices[victim.channel]
+        return victim.channel
+
+    def play(self, filename, category, loops=0, volume=1.):
+        """plays sound, returns Voice() for its fading or stopping.
+        Without initialized mixer (headless World()) nothing is played"""
+        if self.muted or not pg.mixer.get_init():
+            return Voice()
+        sound = self.get_sound(filename)
+        channel = self.get_channel(category)
+        if channel is None:
+            return Voice()
+        channel.set_volume(volume)
+        channel.play(sound, loops=loops)
+        self.serial += 1
+        voice = self.voices[channel] = Voice(self, channel, category,
+                                             self.serial)
+        return voice
+
+    def fadeout(self, category, time):
+        """fade out all voices of the category"""
+        for voice in list(self.voices.values()):
+            if voice.category == category:
+                voice.fadeout(time)
+
+
+SOUNDS = SoundBank()
+
 
 class ShiftableSpriteGroup(sprite.Group):
     """modified sprite.Group with screen shift option
-    for camera movement imitation"""
-    def __init__(self, *args, **kwargs):
+    for camera movement imitation.
+    Keeps sprites indexed by field cell of theirs top-left corner
+    for constant-time lookups by position.
+    static=True promises sprites aligned to the field grid and never moved"""
+    def __init__(self, *args, static=False, **kwargs):
+        # index must exist before sprite.Group.__init__ adds any sprite
+        self.cells = {}
+        self.sprites_cells = {}
+        # adding order of sprites keeps drawing order of culled sprites
+        self.serials = {}
+        self.serial = 0
+        self.drawn = []
+        self.static = static
         super().__init__(*args, **kwargs)
         self.view_shift = 0, 0
 
+    def add_internal(self, spr, *args):
+        super().add_internal(spr, *args)
+        self.serial += 1
+        self.serials[spr] = self.serial
+        self.index_sprite(spr)
+
+    def remove_internal(self, spr):
+        super().remove_internal(spr)
+        del self.serials[spr]
+        self.unindex_sprite(spr)
+
+    def index_sprite(self, spr):
+        """put sprite into the cell of its current position"""
+        cell = get_cell(spr.rect.x, spr.rect.y)
+        old_cell = self.sprites_cells.get(spr)
+        if old_cell == cell:
+            return
+        if old_cell is not None:
+            self.unindex_sprite(spr)
+        self.cells.setdefault(cell, []).append(spr)
+        self.sprites_cells[spr] = cell
+
+    def unindex_sprite(self, spr):
+        """drop sprite from the cells index"""
+        cell = self.sprites_cells.pop(spr, None)
+        if cell is None:
+            return
+        cell_sprites = self.cells[cell]
+        cell_sprites.remove(spr)
+        if not cell_sprites:
+            del self.cells[cell]
+
+    def reindex(self):
+        """refresh cells of sprites moved since the last call"""
+        for spr in self.sprites():
+            self.index_sprite(spr)
+
+    def clone(self, copies):
+        """group of copies ({sprite: copy}) of the sprites with the same
+        adding order and cells index, no sprite is added one by one"""
+        clone = ShiftableSpriteGroup(static=self.static)
+        clone.spritedict = dict.fromkeys(copies[spr]
+                                         for spr in self.spritedict)
+        clone.serials = {copies[spr]: serial
+                         for spr, serial in self.serials.items()}
+        clone.serial = self.serial
+        clone.cells = {cell: [copies[spr] for spr in sprites]
+                       for cell, sprites in self.cells.items()}
+        clone.sprites_cells = {copies[spr]: cell
+                               for spr, cell in self.sprites_cells.items()}
+        for spr in clone.spritedict:
+            spr.add_internal(clone)
+        return clone
+
+    def update(self, *args, **kwargs):
+        """update sprites and follow theirs movements in the index.
+        Index is refreshed right after each sprite update,
+        so next sprites collide with actual positions"""
+        if self.static:
+            super().update(*args, **kwargs)
+            return
+        for spr in self.sprites():
+            spr.update(*args, **kwargs)
+            if spr in self.spritedict:
+                self.index_sprite(spr)
+
     def set_view_shift(self, x, y):
         """set shift of "camera" """
         self.view_shift = x, y
 
     def draw(self, surface):
-        """draw all sprites onto the surface"""
-        # super().draw(surface)
-        sprites = self.sprites()
-        surface_blit = surface.blit
-        for spr in sprites:
-            rect = spr.rect.copy()
-            rect.x += self.view_shift[0]
-            rect.y += self.view_shift[1]
-            self.spritedict[spr] = surface_blit(spr.image, rect)
+        """draw sprites visible inside of the surface clip
+        by one batch of blits"""
+        shift_x, shift_y = self.view_shift
+        view = surface.get_clip().move(-shift_x, -shift_y)
+        sprites = self.get_sprites_in_rect(view)
+        sprites.sort(key=self.serials.__getitem__)
+        spritedict = self.spritedict
+        for spr in self.drawn:
+            # sprites gone out of the view are not on the surface now
+            if spr in spritedict:
+                spritedict[spr] = 0
+        spritedict.update(zip(
+            sprites,
+            surface.blits([(spr.image,
+                            (spr.rect.x + shift_x, spr.rect.y + shift_y))
+                           for spr in sprites])))
+        self.drawn = sprites
         self.lostsprites = []
 
+    def get_screen_rects(self, surface):
+        """returns rects of sprites visible on the surface
+        in the surface coordinates"""
+        view = surface.get_rect(topleft=(-self.view_shift[0],
+                                         -self.view_shift[1]))
+        return [spr.rect.move(self.view_shift)
+                for spr in self.get_sprites_in_rect(view)]
+
     def contains_sprite_of_class(self, cls):
         """check cls-type sprite in group"""
         for sprite in self:
@@ -637,111 +1545,1444 @@ class ShiftableSpriteGroup(sprite.Group):
 
     def get_sprite_in_pos(self, x, y):
         """returns sprite in position x*y"""
-        for sprite in self:
+        for sprite in self.cells.get(get_cell(x, y), ()):
             if sprite.rect.x == x and sprite.rect.y == y:
                 return sprite
 
+    def has_sprite_in_pos(self, x, y):
+        return self.get_sprite_in_pos(x, y) is not None
+
+    def get_sprites_in_cell(self, column, row):
+        """returns list of sprites with top-left corner in the cell"""
+        return list(self.cells.get((column, row), ()))
+
+    def get_sprites_in_rect(self, rect):
+        """returns list of sprites colliding with rect.
+        Sprites are expected to be not bigger than a block"""
+        if not self.cells:
+            return []
+        if self.static:
+            # aligned sprite starts in one of the cells overlapped by rect
+            left, top = get_cell(rect.left, rect.top)
+        else:
+            left, top = get_cell(rect.left - BLOCK_WIDTH + 1,
+                                 rect.top - BLOCK_HEIGHT + 1)
+        right, bottom = get_cell(rect.right - 1, rect.bottom - 1)
+        found = []
+        cells = self.cells
+        for row in range(top, bottom + 1):
+            for column in range(left, right + 1):
+                for spr in cells.get((column, row), ()):
+                    if rect.colliderect(spr.rect):
+                        found.append(spr)
+        return found
+
+
+class Tile:
+    """lightweight block of TileMap() cell.
+    Made on demand by lookups, kept alive only while brick is dying"""
+    __slots__ = ("tilemap", "kind", "rect", "image", "anim_die", "alive")
+
+    def __init__(self, tilemap, kind, column, row):
+        self.tilemap = tilemap
+        self.kind = kind
+        self.rect = pg.Rect(column * BLOCK_WIDTH, row * BLOCK_HEIGHT,
+                            BLOCK_WIDTH, BLOCK_HEIGHT)
+        self.image = tilemap.images[kind]
+        self.anim_die = None
+        self.alive = True
+
+    def __repr__(self):
+        return f"{'?XB'[self.kind]}{get_cell(self.rect.x, self.rect.y)}"
+
+    def exploded(self):
+        self.tilemap.explode(*get_cell(self.rect.x, self.rect.y))
+
+
+class TileMap:
+    """static field cells (walls and bricks) stored in typed array
+    with images shared by all cells of a kind.
+    Quacks like static ShiftableSpriteGroup() for lookups and drawing"""
+    static = True
+    # every change of cells kinds gets new version of tiles
+    versions = count(1)
+
+    def __init__(self, columns, rows, sprites_tile):
+        self.columns = columns
+        self.rows = rows
+        self.tiles = array('B', bytes(columns * rows))
+        self.images = {TILE_EMPTY: None,
+                       TILE_WALL: sprites_tile[3][3],
+                       TILE_BRICK: sprites_tile[3][4]}
+        self.classes = {TILE_WALL: WallBlock, TILE_BRICK: BrickBlock}
+        self.anim_die = sprites_tile[3][5:11]
+        self.counts = {TILE_EMPTY: columns * rows, TILE_WALL: 0, TILE_BRICK: 0}
+        self.version = next(self.versions)
+        # (version, bytes) of tiles shared by snapshots until the next change
+        self.tiles_bytes = None
+        self.dying = {}
+        # EventBus() of the world, if any
+        self.events = None
+        self.view_shift = 0, 0
+        self.chunks = {}
+        self.layer_format = None
+        self.dirty_cells = set()
+
+    def __len__(self):
+        return self.counts[TILE_WALL] + self.counts[TILE_BRICK]
+
+    def __iter__(self):
+        return iter(self.sprites())
+
+    def sprites(self):
+        """returns list of tiles of all not empty cells (slow)"""
+        return [self.get_tile(column, row)
+                for row in range(self.rows)
+                for column in range(self.columns)
+                if self.tiles[row * self.columns + column]]
+
+    def get_kind(self, column, row):
+        if 0 <= column < self.columns and 0 <= row < self.rows:
+            return self.tiles[row * self.columns + column]
+        return TILE_EMPTY
+
+    def set_kind(self, column, row, kind):
+        index = row * self.columns + column
+        self.counts[self.tiles[index]] -= 1
+        self.counts[kind] += 1
+        self.tiles[index] = kind
+        self.version = next(self.versions)
+        self.invalidate(column, row)
+
+    def invalidate_layer(self):
+        """drop pre-rendered chunks, e.g. when tiles images are changed"""
+        self.chunks.clear()
+        self.dirty_cells.clear()
+
+    def invalidate(self, column, row):
+        """mark cell to be redrawn in already rendered layer chunk"""
+        if (column // LAYER_CHUNK, row // LAYER_CHUNK) in self.chunks:
+            self.dirty_cells.add((column, row))
+
+    def get_tile(self, column, row):
+        """returns Tile() of the cell or None for empty one"""
+        tile = self.dying.get((column, row))
+        if tile is not None:
+            return tile
+        kind = self.get_kind(column, row)
+        if kind:
+            return Tile(self, kind, column, row)
+
+    def explode(self, column, row):
+        """start death animation of the brick in the cell"""
+        if self.get_kind(column, row) != TILE_BRICK or \
+                (column, row) in self.dying:
+            return
+        tile = self.add_dying(column, row)
+        if self.events:
+            self.events.emit(EVENT_BRICK_DESTROYED, tile)
+
+    def add_dying(self, column, row):
+        """returns new dying brick of the cell at the first frame"""
+        tile = self.dying[column, row] = Tile(self, TILE_BRICK, column, row)
+        tile.alive = False
+        tile.anim_die = list(self.anim_die)
+        return tile
+
+    def update(self, time):
+        """brick death animations, frame per update like BrickBlock()"""
+        for (column, row), tile in list(self.dying.items()):
+            tile.image = tile.anim_die.pop(0)
+            self.invalidate(column, row)
+            if not tile.anim_die:
+                del self.dying[column, row]
+                self.set_kind(column, row, TILE_EMPTY)
+
+    def snapshot(self):
+        """tiles (copied only if changed since the previous snapshot),
+        counts and dying bricks for World().snapshot()"""
+        if self.tiles_bytes is None or self.tiles_bytes[0] != self.version:
+            self.tiles_bytes = self.version, self.tiles.tobytes()
+        return (self.tiles_bytes, tuple(self.counts.items()),
+                tuple((tile, len(tile.anim_die), tile.image)
+                      for tile in self.dying.values()))
+
+    def restore(self, values):
+        tiles_bytes, counts, dying = values
+        if tiles_bytes[0] != self.version:
+            self.version, data = self.tiles_bytes = tiles_bytes
+            self.tiles = array('B', data)
+            self.counts = dict(counts)
+            self.invalidate_layer()
+        for column, row in self.dying:
+            self.invalidate(column, row)
+        self.dying = {}
+        for tile, frames_left, image in dying:
+            cell = get_cell(tile.rect.x, tile.rect.y)
+            if len(tile.anim_die) != frames_left:
+                tile.anim_die = self.anim_die[len(self.anim_die) -
+                                              frames_left:]
+            tile.image = image
+            self.dying[cell] = tile
+            self.invalidate(*cell)
+
+    def clone(self):
+        """independent copy without rendered layer"""
+        clone = copy.copy(self)
+        clone.tiles = array('B', self.tiles)
+        clone.counts = dict(self.counts)
+        clone.dying = {}
+        for cell, tile in self.dying.items():
+            clone.dying[cell] = tile = copy.copy(tile)
+            tile.tilemap = clone
+            tile.anim_die = list(tile.anim_die)
+        clone.chunks = {}
+        clone.layer_format = None
+        clone.dirty_cells = set()
+        return clone
+
+    def get_state(self):
+        """cells kinds and dying bricks for World().get_state()"""
+        return {"tiles": self.tiles.tobytes(),
+                "dying": [[column, row, len(tile.anim_die)]
+                          for (column, row), tile in self.dying.items()]}
+
+    def set_state(self, state):
+        self.tiles = array('B', state["tiles"])
+        self.version = next(self.versions)
+        self.counts = {kind: self.tiles.count(kind)
+                       for kind in (TILE_EMPTY, TILE_WALL, TILE_BRICK)}
+        self.dying = {}
+        for column, row, frames_left in state["dying"]:
+            # not explode(): the brick is already counted by events
+            tile = self.add_dying(column, row)
+            # bricks dying animations are popped from the start
+            while len(tile.anim_die) > frames_left:
+                tile.image = tile.anim_die.pop(0)
+        self.invalidate_layer()
+
+    def set_view_shift(self, x, y):
+        """set shift of "camera" """
+        self.view_shift = x, y
+
+    def contains_sprite_of_class(self, cls):
+        """check cls-type block in the field"""
+        return any(self.counts[kind] and issubclass(tile_class, cls)
+                   for kind, tile_class in self.classes.items())
+
+    def get_sprite_in_pos(self, x, y):
+        """returns tile in position x*y"""
+        if x % BLOCK_WIDTH or y % BLOCK_HEIGHT:
+            return None
+        return self.get_tile(*get_cell(x, y))
+
+    def has_sprite_in_pos(self, x, y):
+        """checks not empty cell in position x*y without making Tile()"""
+        if x % BLOCK_WIDTH or y % BLOCK_HEIGHT:
+            return False
+        return bool(self.get_kind(*get_cell(x, y)))
+
+    def get_sprites_in_cell(self, column, row):
+        tile = self.get_tile(column, row)
+        return [tile] if tile else []
+
+    def get_corners_in_rect(self, rect):
+        """returns list of (x, y) top-left corners of not empty cells
+        overlapped by rect, for collisions without Tile() objects"""
+        left, top = get_cell(rect.left, rect.top)
+        right, bottom = get_cell(rect.right - 1, rect.bottom - 1)
+        left = max(left, 0)
+        right = min(right, self.columns - 1)
+        tiles = self.tiles
+        found = []
+        for row in range(max(top, 0), min(bottom, self.rows - 1) + 1):
+            index = row * self.columns
+            for column in range(left, right + 1):
+                if tiles[index + column]:
+                    found.append((column * BLOCK_WIDTH, row * BLOCK_HEIGHT))
+        return found
+
+    def explode_cells(self, cells):
+        """explode() bricks of the cells, Tile() is made only for them"""
+        for column, row in cells:
+            self.explode(column, row)
+
+    def get_sprites_in_rect(self, rect):
+        """returns list of tiles of cells overlapped by rect"""
+        left, top = get_cell(rect.left, rect.top)
+        right, bottom = get_cell(rect.right - 1, rect.bottom - 1)
+        found = []
+        for row in range(top, bottom + 1):
+            for column in range(left, right + 1):
+                tile = self.get_tile(column, row)
+                if tile:
+                    found.append(tile)
+        return found
+
+    def get_cell_image(self, column, row):
+        tile = self.dying.get((column, row))
+        if tile is not None:
+            return tile.image
+        return self.images[self.tiles[row * self.columns + column]]
+
+    def render_chunk(self, chunk_column, chunk_row, surface):
+        """render square of LAYER_CHUNK*LAYER_CHUNK cells into new
+        layer chunk in format of surface"""
+        left = chunk_column * LAYER_CHUNK
+        top = chunk_row * LAYER_CHUNK
+        right = min(left + LAYER_CHUNK, self.columns)
+        bottom = min(top + LAYER_CHUNK, self.rows)
+        chunk = pg.Surface(((right - left) * BLOCK_WIDTH,
+                            (bottom - top) * BLOCK_HEIGHT)).convert(surface)
+        chunk.fill(pg.Color(BACKGROUND_COLOR))
+        chunk.set_colorkey(pg.Color(BACKGROUND_COLOR))
+        blits = []
+        for row in range(top, bottom):
+            for column in range(left, right):
+                image = self.get_cell_image(column, row)
+                if image:
+                    blits.append((image, ((column - left) * BLOCK_WIDTH,
+                                          (row - top) * BLOCK_HEIGHT)))
+        chunk.blits(blits, False)
+        return chunk
+
+    def get_dirty_screen_rects(self):
+        """returns screen rects of cells changed since the last drawing"""
+        return [pg.Rect(column * BLOCK_WIDTH + self.view_shift[0],
+                        row * BLOCK_HEIGHT + self.view_shift[1],
+                        BLOCK_WIDTH, BLOCK_HEIGHT)
+                for column, row in self.dirty_cells]
+
+    def render_dirty_cells(self):
+        """redraw changed cells of already rendered chunks"""
+        cell_rect = pg.Rect(0, 0, BLOCK_WIDTH, BLOCK_HEIGHT)
+        for column, row in self.dirty_cells:
+            chunk = self.chunks.get((column // LAYER_CHUNK,
+                                     row // LAYER_CHUNK))
+            if chunk is None:
+                continue
+            cell_rect.topleft = (column % LAYER_CHUNK * BLOCK_WIDTH,
+                                 row % LAYER_CHUNK * BLOCK_HEIGHT)
+            chunk.fill(pg.Color(BACKGROUND_COLOR), cell_rect)
+            image = self.get_cell_image(column, row)
+            if image:
+                chunk.blit(image, cell_rect)
+        self.dirty_cells.clear()
+
+    def draw(self, surface):
+        """draw chunks of the pre-rendered layer visible inside of
+        the surface clip.
+        Chunks are rendered at first appearance on screen,
+        least recently shown ones are dropped over LAYER_CHUNKS_CACHED"""
+        # set_mode() keeps the display surface object, so changes of
+        # display mode are detected by its size and pixel format
+        layer_format = (surface.get_size(), surface.get_bitsize(),
+                        surface.get_masks())
+        if self.layer_format != layer_format:
+            # chunks are to be converted again
+            self.invalidate_layer()
+            self.layer_format = layer_format
+        self.render_dirty_cells()
+
+        shift_x, shift_y = self.view_shift
+        view = surface.get_clip()
+        chunk_width = LAYER_CHUNK * BLOCK_WIDTH
+        chunk_height = LAYER_CHUNK * BLOCK_HEIGHT
+        left = max((view.left - shift_x) // chunk_width, 0)
+        top = max((view.top - shift_y) // chunk_height, 0)
+        right = min((view.right - shift_x - 1) // chunk_width,
+                    (self.columns - 1) // LAYER_CHUNK)
+        bottom = min((view.bottom - shift_y - 1) // chunk_height,
+                     (self.rows - 1) // LAYER_CHUNK)
+        blits = []
+        for chunk_row in range(top, bottom + 1):
+            for chunk_column in range(left, right + 1):
+                key = chunk_column, chunk_row
+                chunk = self.chunks.pop(key, None)
+                if chunk is None:
+                    chunk = self.render_chunk(*key, surface)
+                self.chunks[key] = chunk
+                blits.append((chunk, (chunk_column * chunk_width + shift_x,
+                                      chunk_row * chunk_height + shift_y)))
+        surface.blits(blits, False)
+        while len(self.chunks) > LAYER_CHUNKS_CACHED:
+            del self.chunks[next(iter(self.chunks))]
+
+
+def make_blast_map(explosions):
+    """union of field cells covered by death-rays of all explosions"""
+    blast_map = set()
+    for explosion in explosions:
+        blast_map |= explosion.get_splash_cells()
+    return blast_map
+
+
+def explode_blast_map(blast_map, list_of_sprites_group):
+    """calls .exploded() once for every sprite touching the blast map,
+    tiles maps explode the cells themselves (theirs tiles are not returned)"""
+    victims = set()
+    cell_rect = pg.Rect(0, 0, BLOCK_WIDTH, BLOCK_HEIGHT)
+    for sprites_group in list_of_sprites_group:
+        if hasattr(sprites_group, "explode_cells"):
+            sprites_group.explode_cells(blast_map)
+            continue
+        for column, row in blast_map:
+            cell_rect.topleft = column * BLOCK_WIDTH, row * BLOCK_HEIGHT
+            victims.update(sprites_group.get_sprites_in_rect(cell_rect))
+    for victim in victims:
+        victim.exploded()
+    return victims
+
+
+def resolve_chain_reaction(bombs, bombs_group, blocking_groups,
+                           delay=CHAIN_REACTION_DELAY):
+    """turns detonated bombs and all bombs caught by theirs death-rays
+    into explosions at once (breadth-first by chain links).
+    Explosion of n-th link starts after n * delay milliseconds,
+    till then its bomb is back on the field: it blocks the cell,
+    is drawn and is dangerous, but is not detonated again.
+    returns list of explosions with clipped rays lengths"""
+    queue = deque((bomb, 0) for bomb in bombs)
+    queued = set(bombs)
+    explosions = []
+    pending = []
+    while queue:
+        bomb, link = queue.popleft()
+        # rays of the next links pass the cells of the previous ones
+        explosion = bomb.get_explosion(delay=link * delay)
+        explosion.set_blocking_groups(blocking_groups)
+        explosions.append(explosion)
+        if bomb.detonated:
+            pending.append(bomb)
+        x, y = explosion.rect.topleft
+        # bombs stop rays, so they are caught at the center or rays ends
+        cells = [(x, y)] + [
+            (x + dx * length * BLOCK_WIDTH, y + dy * length * BLOCK_HEIGHT)
+            for (dx, dy), length in zip(explosion.rays_directions,
+                                        explosion.rays_lengths)]
+        for cell_x, cell_y in cells:
+            caught = bombs_group.get_sprite_in_pos(cell_x, cell_y)
+            if caught and caught not in queued:
+                caught.exploded()
+                queued.add(caught)
+                queue.append((caught, link + 1))
+    bombs_group.add(pending)
+    return explosions
+
+
+# player input of a single tick
+Controls = namedtuple("Controls", "horizontal vertical action")
+
+
+class SplitMix(random.Random):
+    """random.Random() with SplitMix64 generator:
+    its whole state is one integer, so snapshots of it cost nothing"""
+    MASK = 2 ** 64 - 1
+
+    def seed(self, a=None, version=2):
+        if a is None:
+            a = int.from_bytes(os.urandom(8), "little")
+        elif not isinstance(a, int):
+            a = int.from_bytes(str(a).encode(), "little")
+        self.state = a & self.MASK
+
+    def getstate(self):
+        return self.state
+
+    def setstate(self, state):
+        self.state = state
+
+    def next64(self):
+        self.state = state = (self.state + 0x9e3779b97f4a7c15) & self.MASK
+        state = (state ^ state >> 30) * 0xbf58476d1ce4e5b9 & self.MASK
+        state = (state ^ state >> 27) * 0x94d049bb133111eb & self.MASK
+        return state ^ state >> 31
+
+    def getrandbits(self, k):
+        bits = 0
+        for shift in range(0, k, 64):
+            bits |= self.next64() << shift
+        return bits & (1 << k) - 1
+
+    def random(self):
+        return (self.next64() >> 11) * 2 ** -53
+
+    def randint(self, a, b):
+        """the same numbers as random.Random().randint() gives
+        with this generator, without its layers of calls"""
+        n = b - a + 1
+        if not 0 < n <= 2 ** 64:
+            return super().randint(a, b)
+        mask = (1 << n.bit_length()) - 1
+        r = self.next64() & mask
+        while r >= n:
+            r = self.next64() & mask
+        return a + r
+
+
+# immutable state of World(): groups are tuples of (sprite, values) pairs
+WorldSnapshot = namedtuple("WorldSnapshot",
+                           "ticks bombs_planted rng events "
+                           "blocks bombs explosions actors")
+# seconds of bombs countdowns rounding between detonations queue and bombs
+DETONATION_SLACK = 1e-6
+
+
+class FlowField:
+    """breadth-first distances to the player cell over the field grid
+    (up to radius cells) and cells of bombs blasts shared by enemies AI.
+    update() recomputes them only when the player cell,
+    the tiles or the bombs are changed"""
+    directions = (-1, 0), (1, 0), (0, -1), (0, 1)
+
+    def __init__(self, world, radius=FLOW_FIELD_RADIUS):
+        self.world = world
+        self.radius = radius
+        self.key = None
+        self.bombs_key = None
+        # (column, row): cells to the player
+        self.distances = {}
+        self.dangers = set()
+
+    def is_passable(self, column, row):
+        return not self.world.blocks_group.get_kind(column, row) and \
+            (column, row) not in self.world.bombs_group.cells
+
+    def is_dangerous(self, column, row):
+        return (column, row) in self.dangers
+
+    def get_distance(self, column, row):
+        """cells to the player or None for unreachable or far cell"""
+        return self.distances.get((column, row))
+
+    def update(self):
+        world = self.world
+        bombs_key = frozenset(world.bombs_group.cells)
+        key = (get_cell(*world.player.rect.center),
+               world.blocks_group.version, bombs_key)
+        if key == self.key:
+            return
+        if (bombs_key, key[1]) != self.bombs_key:
+            self.bombs_key = bombs_key, key[1]
+            self.dangers = self.get_dangers()
+        self.key = key
+        self.distances = self.get_distances(key[0])
+
+    def get_distances(self, start):
+        distances = {start: 0}
+        queue = deque([start])
+        is_passable = self.is_passable
+        while queue:
+            cell = queue.popleft()
+            distance = distances[cell] + 1
+            if distance > self.radius:
+                continue
+            column, row = cell
+            for dx, dy in self.directions:
+                neighbour = column + dx, row + dy
+                if neighbour not in distances and is_passable(*neighbour):
+                    distances[neighbour] = distance
+                    queue.append(neighbour)
+        return distances
+
+    def get_dangers(self):
+        """cells of bombs and of theirs rays stopped by blocks"""
+        get_kind = self.world.blocks_group.get_kind
+        dangers = set()
+        for bomb in self.world.bombs_group:
+            column, row = get_cell(bomb.rect.x, bomb.rect.y)
+            dangers.add((column, row))
+            for dx, dy in self.directions:
+                for length in range(1, bomb.radius + 1):
+                    cell = column + dx * length, row + dy * length
+                    if get_kind(*cell):
+                        break
+                    dangers.add(cell)
+        return dangers
+
+
+class EventBus:
+    """events of the world: live counters of every kind
+    and callbacks of subscribers called as callback(kind, source),
+    where source is the sprite or the tile"""
+    def __init__(self, counts=None):
+        self.counts = dict.fromkeys(EVENTS, 0)
+        if counts:
+            self.counts.update(counts)
+        self.subscribers = {kind: [] for kind in EVENTS}
+
+    def subscribe(self, kind, callback):
+        self.subscribers[kind].append(callback)
+
+    def unsubscribe(self, kind, callback):
+        self.subscribers[kind].remove(callback)
+
+    def emit(self, kind, source=None):
+        self.counts[kind] += 1
+        for callback in self.subscribers[kind]:
+            callback(kind, source)
+
+
+def make_blank_tiles(rows=22, cols=14):
+    """sprites table without images for headless World(),
+    animations keep theirs lengths and timings"""
+    return [[None] * cols for _ in range(rows)]
+
+
+class World:
+    """game rules without display, sounds and frame rate:
+    field, actors, bombs and explosions advanced by step() calls.
+    Without sprites_tile sprites have no images (headless mode).
+    All randomness comes from own generator seeded by seed,
+    so the same seed and controls give the same world.
+    Bricks destroyed, deaths and bombs are counted by events bus,
+    bombs wait for detonation in the queue ordered by countdowns ends.
+    Enemies share one FlowField() to the player"""
+    actors_classes = {cls.__name__: cls
+                      for cls in (Player, Ballom, Onil, Dahl, Doria)}
+
+    def __init__(self, field=DEMO_FIELD, sprites_tile=None, seed=None,
+                 blocks_probability=BLOCKS_PROBABILITY):
+        if sprites_tile is None:
+            sprites_tile = make_blank_tiles()
+        self.sprites_tile = sprites_tile
+        # states keep images as cells of sprites table
+        self.images_cells = {image: (row, column)
+                             for row, images in enumerate(sprites_tile)
+                             for column, image in enumerate(images)
+                             if image is not None}
+        self.field = field
+        self.seed = seed
+        self.blocks_probability = blocks_probability
+        self.rng = SplitMix(seed)
+        self.ticks = 0
+        self.bombs_planted = 0
+        self.events = EventBus()
+        # seconds of bombs countdowns passed, for detonations queue
+        self.clock = 0.
+        # heap of (clock of detonation, serial, bomb)
+        self.detonations = []
+        self.bombs_group = ShiftableSpriteGroup(static=True)
+        self.explosions_group = ShiftableSpriteGroup()
+        self.actors_group = ShiftableSpriteGroup()
+        self.flow_field = FlowField(self)
+        self.load_field(field)
+
+    def load_field(self, field):
+        """parse field string into groups of sprites"""
+        sprites_tile = self.sprites_tile
+        actors_group = self.actors_group
+
+        player = None
+        field_height = len(field.split('\n')) * BLOCK_HEIGHT
+        field_width = max(map(len, field
+                              .replace('\r', '')
+                              .replace(' ', '')
+                              .split('\n'))) * BLOCK_WIDTH
+        blocks_group = TileMap(field_width // BLOCK_WIDTH,
+                               field_height // BLOCK_HEIGHT,
+                               sprites_tile)
+
+        x = y = 0
+        for row in field.replace('\r', '').split('\n'):
+            x = 0
+            for cell in row.strip():
+                block = TILE_EMPTY
+                if cell == '#':
+                    block = TILE_WALL
+                elif cell == 'B':
+                    block = TILE_BRICK
+                elif cell == '_' and \
+                        not self.rng.randint(0, self.blocks_probability):
+                    block = TILE_BRICK
+                elif cell == 'P' and not player:
+                    player = Player(x, y,
+                                    sprites_tile=sprites_tile)
+                elif cell == 'q':
+                    self.add_bomb(Bomb(x, y,
+                                       sprites_tile=sprites_tile,
+                                       timer=5,
+                                       radius=1))
+                elif cell == 'Q':
+                    self.add_bomb(Bomb(x, y,
+                                       sprites_tile=sprites_tile,
+                                       timer=25,
+                                       radius=5))
+                elif cell == 'b':
+                    actors_group.add(Ballom(x, y,
+                                            sprites_tile=sprites_tile))
+                elif cell == 'o':
+                    actors_group.add(Onil(x, y,
+                                          sprites_tile=sprites_tile))
+                elif cell == 'd':
+                    actors_group.add(Dahl(x, y,
+                                          sprites_tile=sprites_tile))
+                elif cell == 'r':
+                    actors_group.add(Doria(x, y,
+                                           sprites_tile=sprites_tile))
+                if block:
+                    blocks_group.set_kind(*get_cell(x, y), block)
+                x += BLOCK_WIDTH
+            y += BLOCK_HEIGHT
+
+        field_center = (field_width // 2 - BLOCK_WIDTH // 2,
+                        field_height // 2 - BLOCK_HEIGHT // 2)
+
+        if player is None:
+            player = Player(*field_center, sprites_tile=sprites_tile)
+        actors_group.add(player)
+        for actor in actors_group:
+            actor.rng = self.rng
+            actor.events = self.events
+            actor.flow_field = self.flow_field
+        blocks_group.events = self.events
+
+        self.player = player
+        self.blocks_group = blocks_group
+        self.field_width = field_width
+        self.field_height = field_height
+
+    def step(self, time, controls):
+        """advance the world by time milliseconds with player controls"""
+        blocks_group = self.blocks_group
+        bombs_group = self.bombs_group
+        explosions_group = self.explosions_group
+        actors_group = self.actors_group
+
+        groups = self.get_colliding_groups()
+        ret = self.player.update(time,
+                                 groups,
+                                 controls.horizontal,
+                                 controls.vertical,
+                                 controls.action,
+                                 directcall=True)
+        actors_group.index_sprite(self.player)
+        blocks_group.update(time)
+        bombs_group.update(time)
+        self.clock += time / 1000
+        blast_map = make_blast_map(explosions_group)
+        victims = explode_blast_map(blast_map, (blocks_group, actors_group,
+                                                bombs_group))
+        explosions_group.update(time)
+        self.update_enemies(time, blast_map, groups)
+
+        if ret:
+            if isinstance(ret, Bomb):
+                self.add_bomb(ret)
+                self.bombs_planted += 1
+
+        detonated = self.pop_detonated(victims)
+        if detonated:
+            explosions_group.add(
+                resolve_chain_reaction(detonated,
+                                       bombs_group,
+                                       (blocks_group, bombs_group)))
+        self.ticks += 1
+
+    def get_colliding_groups(self):
+        """groups of sprites colliding with actors"""
+        return self.blocks_group, self.bombs_group, self.actors_group
+
+    def update_enemies(self, time, blast_map, groups):
+        """move enemies colliding with groups,
+        blast_map is exploded already"""
+        self.flow_field.update()
+        self.actors_group.update(time, groups)
+
+    def add_bomb(self, bomb):
+        """put armed bomb onto the field and into detonations queue"""
+        bomb.events = self.events
+        self.bombs_group.add(bomb)
+        heappush(self.detonations, (self.clock + bomb.countdown,
+                                    self.bombs_group.serials[bomb], bomb))
+        self.events.emit(EVENT_BOMB_ARMED, bomb)
+
+    def queue_detonations(self):
+        """detonations queue of bombs on the field, e.g. after restore"""
+        serials = self.bombs_group.serials
+        self.detonations = [
+            (self.clock + bomb.countdown if bomb.alive else float("-inf"),
+             serials[bomb], bomb)
+            for bomb in self.bombs_group]
+        heapify(self.detonations)
+
+    def pop_detonated(self, victims=()):
+        """bombs to be detonated in order of adding: caught by blasts
+        (of victims) and ones at the top of queue with countdowns ended.
+        Bombs gone from the field are dropped from the queue here"""
+        bombs = self.bombs_group.spritedict
+        detonated = {victim for victim in victims
+                     if isinstance(victim, Bomb) and victim in bombs and
+                     not victim.detonated}
+        queue = self.detonations
+        early = []
+        while queue and (queue[0][0] <= self.clock + DETONATION_SLACK or
+                         queue[0][2].is_exploded()):
+            entry = heappop(queue)
+            bomb = entry[2]
+            if bomb not in bombs or bomb.detonated:
+                continue
+            if bomb.is_exploded():
+                detonated.add(bomb)
+            else:
+                # clock rounding differs from the bomb countdown one
+                early.append(entry)
+        for entry in early:
+            heappush(queue, entry)
+        return sorted(detonated, key=self.bombs_group.serials.__getitem__)
+
+    def snapshot(self):
+        """cheap immutable WorldSnapshot() for restore() into this world.
+        Sprites are referenced, not copied: restore() puts them back
+        with snapshot values, tiles bytes are shared until changed"""
+        return WorldSnapshot(
+            self.ticks,
+            self.bombs_planted,
+            self.rng.getstate(),
+            tuple(self.events.counts.values()),
+            self.blocks_group.snapshot(),
+            tuple((bomb, bomb.snapshot()) for bomb in self.bombs_group),
+            tuple((explosion, explosion.snapshot())
+                  for explosion in self.explosions_group),
+            tuple((actor, actor.snapshot()) for actor in self.actors_group))
+
+    def restore(self, snapshot):
+        """return the world into the snapshot() state.
+        Snapshots of other worlds (even clones) are not accepted"""
+        self.ticks = snapshot.ticks
+        self.bombs_planted = snapshot.bombs_planted
+        self.rng.setstate(snapshot.rng)
+        self.events.counts.update(zip(EVENTS, snapshot.events))
+        self.blocks_group.restore(snapshot.blocks)
+        for group, pairs in ((self.bombs_group, snapshot.bombs),
+                             (self.explosions_group, snapshot.explosions),
+                             (self.actors_group, snapshot.actors)):
+            for spr, values in pairs:
+                spr.restore(values)
+            sprites = [spr for spr, _ in pairs]
+            if group.sprites() != sprites:
+                group.empty()
+                group.add(sprites)
+        self.actors_group.reindex()
+        self.queue_detonations()
+
+    def clone(self):
+        """independent copy of the world for another line of simulation.
+        Every sprite is copied (groups are copied with theirs indexes),
+        snapshot() and restore() are the cheap way back"""
+        clone = copy.copy(self)
+        clone.rng = SplitMix(self.rng.getstate())
+        # subscribers stay with this world
+        clone.events = EventBus(self.events.counts)
+        clone.blocks_group = self.blocks_group.clone()
+        clone.blocks_group.events = clone.events
+        copies = {}
+        for bomb in self.bombs_group:
+            bomb_clone = copies[bomb] = clone_sprite(bomb)
+            bomb_clone.events = clone.events
+        clone.bombs_group = self.bombs_group.clone(copies)
+        clone.queue_detonations()
+        blocking_groups = (clone.blocks_group, clone.bombs_group)
+        clone.explosions_group = ShiftableSpriteGroup(
+            [explosion.clone(blocking_groups)
+             for explosion in self.explosions_group])
+        # computed distances are shared until changes
+        clone.flow_field = copy.copy(self.flow_field)
+        clone.flow_field.world = clone
+        for actor in self.actors_group:
+            actor_clone = copies[actor] = actor.clone()
+            actor_clone.rng = clone.rng
+            actor_clone.events = clone.events
+            actor_clone.flow_field = clone.flow_field
+        clone.actors_group = self.actors_group.clone(copies)
+        clone.player = copies[self.player]
+        return clone
+
+    def get_state(self):
+        """everything needed to continue simulation as plain values,
+        ready for json (except bytes of tiles)"""
+        images_cells = self.images_cells
+        return {"ticks": self.ticks,
+                "bombs_planted": self.bombs_planted,
+                "rng": self.rng.getstate(),
+                "events": dict(self.events.counts),
+                "blocks": self.blocks_group.get_state(),
+                "bombs": [bomb.get_state(images_cells)
+                          for bomb in self.bombs_group],
+                "explosions": [explosion.get_state(images_cells)
+                               for explosion in self.explosions_group],
+                "actors": [actor.get_state(images_cells)
+                           for actor in self.actors_group]}
+
+    def set_state(self, state):
+        """restore world of the same field from get_state() values.
+        Groups and tiles are refilled in place, player is a new sprite"""
+        sprites_tile = self.sprites_tile
+        muted = SOUNDS.muted
+        SOUNDS.muted = True
+
+        self.ticks = state["ticks"]
+        self.bombs_planted = state["bombs_planted"]
+        self.rng.setstate(state["rng"])
+        # older replays keyframes have no events
+        self.events.counts.update(dict.fromkeys(EVENTS, 0))
+        self.events.counts.update(state.get("events", {}))
+        self.blocks_group.set_state(state["blocks"])
+
+        self.bombs_group.empty()
+        for bomb_state in state["bombs"]:
+            bomb = Bomb.from_state(bomb_state, sprites_tile)
+            bomb.events = self.events
+            self.bombs_group.add(bomb)
+        self.queue_detonations()
+
+        self.explosions_group.empty()
+        blocking_groups = (self.blocks_group, self.bombs_group)
+        self.explosions_group.add([
+            Explosion.from_state(explosion_state, sprites_tile,
+                                 blocking_groups)
+            for explosion_state in state["explosions"]])
+
+        self.actors_group.empty()
+        for actor_state in state["actors"]:
+            actor = self.actors_classes[actor_state["class"]].from_state(
+                actor_state, sprites_tile)
+            actor.rng = self.rng
+            actor.events = self.events
+            actor.flow_field = self.flow_field
+            if isinstance(actor, Player):
+                self.player = actor
+            self.actors_group.add(actor)
+
+        SOUNDS.muted = muted
+
+    def is_failed(self):
+        return not self.player.is_alive()
+
+    def is_won(self):
+        """field is clean and player is alone on it"""
+        return not self.is_failed() and \
+            not self.blocks_group.counts[TILE_BRICK] and \
+            len(self.actors_group) == 1
+
+
+def pack_controls(controls):
+    """one byte of tick controls: 2 bits per axis and action bit"""
+    return (controls.horizontal + 1) | (controls.vertical + 1) << 2 | \
+        bool(controls.action) << 4
+
+
+def unpack_controls(byte):
+    return Controls((byte & 3) - 1, (byte >> 2 & 3) - 1, bool(byte >> 4))
+
+
+def pack_state(state):
+    """world state as compressed json, bytes are kept in base64"""
+    return zlib.compress(json.dumps(
+        state,
+        default=lambda data: {"base64": base64.b64encode(data).decode()}
+    ).encode())
+
+
+def unpack_state(data):
+    return json.loads(
+        zlib.decompress(data),
+        object_hook=lambda obj: base64.b64decode(obj["base64"])
+        if "base64" in obj else obj)
+
+
+class ReplayWriter:
+    """records session into file incrementally:
+    header with field and seed, runs of equal ticks controls
+    and world keyframes every keyframe_ticks ticks.
+    Records are appended and flushed as the game goes, so even not
+    closed file of killed game is playable up to the last change
+    of controls or keyframe, only the current run of ticks is lost"""
+    MAGIC = b"DEXRPLY5"
+    # seed, milliseconds per tick, ticks between keyframes, field length
+    HEADER = struct.Struct("<QHII")
+    # b"C", controls byte, ticks count
+    CONTROLS = struct.Struct("<cBH")
+    # b"K", tick, length of packed state
+    KEYFRAME = struct.Struct("<cII")
+
+    def __init__(self, filename, world, tick_time=TICK_TIME,
+                 keyframe_ticks=REPLAY_KEYFRAME_TICKS):
+        if world.seed is None:
+            raise ValueError("world without seed can not be replayed")
+        self.keyframe_ticks = keyframe_ticks
+        self.controls = None
+        self.count = 0
+        field = world.field.encode()
+        # never overwrite other sessions
+        self.file = open(filename, "xb")
+        self.file.write(self.MAGIC)
+        self.file.write(self.HEADER.pack(world.seed, tick_time,
+                                         keyframe_ticks, len(field)))
+        self.file.write(field)
+
+    @classmethod
+    def create(cls, directory, world):
+        """writer into new file of directory named by the current time,
+        sessions started in the same second get numbered suffixes"""
+        os.makedirs(directory, exist_ok=True)
+        name = datetime.now().strftime("%Y%m%d-%H%M%S")
+        for number in count():
+            suffix = f"-{number}" if number else ""
+            try:
+                return cls(os.path.join(directory, f"{name}{suffix}.dxr"),
+                           world)
+            except FileExistsError:
+                pass
+
+    def record(self, world, controls):
+        """remember controls of the world next step,
+        call before World().step()"""
+        if world.ticks and not world.ticks % self.keyframe_ticks:
+            self.flush()
+            data = pack_state(world.get_state())
+            self.file.write(self.KEYFRAME.pack(b"K", world.ticks,
+                                               len(data)))
+            self.file.write(data)
+            self.file.flush()
+        byte = pack_controls(controls)
+        if byte != self.controls or self.count == 0xffff:
+            self.flush()
+            self.controls = byte
+        self.count += 1
+
+    def flush(self):
+        """write current run of equal controls"""
+        if self.count:
+            self.file.write(self.CONTROLS.pack(b"C", self.controls,
+                                               self.count))
+            self.file.flush()
+            self.count = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+class Replay:
+    """recorded session of ReplayWriter() for playback:
+    controls of every tick are unpacked at once,
+    keyframes are read on demand for seeking"""
+    def __init__(self, filename):
+        writer = ReplayWriter
+        self.file = open(filename, "rb")
+        if self.file.read(len(writer.MAGIC)) != writer.MAGIC:
+            raise ValueError(f"not a replay file: {filename}")
+        self.seed, self.tick_time, self.keyframe_ticks, length = \
+            writer.HEADER.unpack(self.file.read(writer.HEADER.size))
+        self.field = self.file.read(length).decode()
+        self.controls = bytearray()
+        # (tick, offset, length) of keyframes states
+        self.keyframes = []
+        self.initial_state = None
+
+        # records of not finished file may be cut off
+        while True:
+            tag = self.file.read(1)
+            if tag == b"C":
+                data = self.file.read(writer.CONTROLS.size - 1)
+                if len(data) < writer.CONTROLS.size - 1:
+                    break
+                _, byte, count = writer.CONTROLS.unpack(tag + data)
+                self.controls += bytes((byte,)) * count
+            elif tag == b"K":
+                data = self.file.read(writer.KEYFRAME.size - 1)
+                if len(data) < writer.KEYFRAME.size - 1:
+                    break
+                _, tick, length = writer.KEYFRAME.unpack(tag + data)
+                offset = self.file.tell()
+                self.file.seek(length, os.SEEK_CUR)
+                if self.file.tell() > os.fstat(self.file.fileno()).st_size:
+                    break
+                self.keyframes.append((tick, offset, length))
+            else:
+                break
+
+    def __len__(self):
+        """ticks count"""
+        return len(self.controls)
+
+    def get_controls(self, tick):
+        return unpack_controls(self.controls[tick])
+
+    def make_world(self, sprites_tile=None):
+        """World() at the beginning of the session"""
+        world = World(self.field, sprites_tile, seed=self.seed)
+        self.initial_state = world.get_state()
+        return world
+
+    def get_keyframe(self, tick):
+        """the closest keyframe at or before the tick,
+        None stands for the beginning of the session"""
+        closest = None
+        for keyframe in self.keyframes:
+            if keyframe[0] > tick:
+                break
+            closest = keyframe
+        return closest
+
+    def load_keyframe(self, keyframe):
+        """world state of the keyframe"""
+        if keyframe is None:
+            return self.initial_state
+        _, offset, length = keyframe
+        self.file.seek(offset)
+        return unpack_state(self.file.read(length))
+
+    def play(self, world, ticks):
+        """steps world by recorded controls up to ticks times.
+        returns count of made steps, 0 at the end of the replay"""
+        count = min(ticks, len(self) - world.ticks)
+        for _ in range(count):
+            world.step(self.tick_time, self.get_controls(world.ticks))
+        return max(count, 0)
+
+    def seek(self, world, tick):
+        """moves world of make_world() to the tick:
+        restores the closest keyframe when it is nearer than world
+        and simulates the rest silently as fast as possible"""
+        tick = max(0, min(tick, len(self)))
+        keyframe = self.get_keyframe(tick)
+        keyframe_tick = keyframe[0] if keyframe else 0
+        if world.ticks > tick or world.ticks < keyframe_tick:
+            world.set_state(self.load_keyframe(keyframe))
+        muted = SOUNDS.muted
+        SOUNDS.muted = True
+        self.play(world, tick - world.ticks)
+        SOUNDS.muted = muted
+
+    def close(self):
+        self.file.close()
+
+
+class Profiler:
+    """milliseconds of main loop stages and of hot methods per frame,
+    sprites counts of groups and allocations per frame.
+    Probes of hot methods are installed by enable() and removed by
+    disable(), so disabled profiler costs a few empty calls per frame.
+    Samples of the last PROFILE_RING_FRAMES frames are kept in a ring
+    and dumped into PROFILE_DIR when a frame exceeds the budget"""
+    # "Class.method" or "function" names in this module
+    hot_paths = ("Actor.collide",
+                 "Explosion.clip_rays_lengths",
+                 "make_blast_map",
+                 "explode_blast_map",
+                 "resolve_chain_reaction",
+                 "FlowField.update",
+                 "ShiftableSpriteGroup.draw",
+                 "TileMap.draw",
+                 "TileMap.render_chunk",
+                 "SpriteSheet.image_at",
+                 "SpriteSheet.view_at")
+
+    def __init__(self, window=PROFILE_WINDOW, ring_frames=PROFILE_RING_FRAMES,
+                 dump_dir=PROFILE_DIR, dumps=PROFILE_DUMPS):
+        self.enabled = False
+        self.originals = {}
+        self.stages = {}
+        self.probes = {}
+        self.collections = 0
+        self.frames = 0
+        self.frame_started = self.lap_started = 0
+        self.allocated_blocks = 0
+        self.window = deque(maxlen=window)
+        self.ring = deque(maxlen=ring_frames)
+        self.dump_dir = dump_dir
+        self.dumps = dumps
+        # no dumps till the ring is refilled after the last one
+        self.dump_after = 0
+        self.overlay = None
+
+    def make_probe(self, name, function):
+        probes = self.probes
+
+        @wraps(function)
+        def probe(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                probes[name] = probes.get(name, 0) + \
+                    (perf_counter() - started) * 1000
+        return probe
+
+    def count_collection(self, phase, info):
+        if phase == "start":
+            self.collections += 1
+
+    def enable(self):
+        if self.enabled:
+            return
+        namespace = globals()
+        for name in self.hot_paths:
+            class_name, _, method = name.rpartition('.')
+            owner = namespace[class_name] if class_name else None
+            original = owner.__dict__[method] if owner else namespace[name]
+            self.originals[name] = original
+            if owner:
+                setattr(owner, method, self.make_probe(name, original))
+            else:
+                namespace[name] = self.make_probe(name, original)
+        gc.callbacks.append(self.count_collection)
+        self.window.clear()
+        self.enabled = True
+        self.begin_frame()
+
+    def disable(self):
+        if not self.enabled:
+            return
+        namespace = globals()
+        for name, original in self.originals.items():
+            class_name, _, method = name.rpartition('.')
+            if class_name:
+                setattr(namespace[class_name], method, original)
+            else:
+                namespace[name] = original
+        self.originals.clear()
+        gc.callbacks.remove(self.count_collection)
+        self.overlay = None
+        self.enabled = False
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
 
-def main():
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.stages.clear()
+        self.probes.clear()
+        self.collections = 0
+        self.allocated_blocks = sys.getallocatedblocks()
+        self.frame_started = self.lap_started = perf_counter()
+
+    def lap(self, stage):
+        """time since the previous lap is spent by the stage"""
+        if not self.enabled:
+            return
+        now = perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0) + \
+            (now - self.lap_started) * 1000
+        self.lap_started = now
+
+    def end_frame(self, groups, budget=FRAME_BUDGET):
+        """groups is {name: group} for sprites counts,
+        the frame longer than budget (if any) dumps the ring"""
+        if not self.enabled:
+            return
+        self.frames += 1
+        sample = {"frame": self.frames,
+                  "ms": (perf_counter() - self.frame_started) * 1000,
+                  "stages": dict(self.stages),
+                  "probes": dict(self.probes),
+                  "sprites": {name: len(group)
+                              for name, group in groups.items()},
+                  "allocated_blocks": sys.getallocatedblocks() -
+                  self.allocated_blocks,
+                  "collections": self.collections}
+        self.window.append(sample)
+        if self.dumps:
+            self.ring.append(sample)
+            if budget and sample["ms"] > budget and \
+                    self.frames >= self.dump_after:
+                self.dump()
+        if not self.frames % (self.window.maxlen // 3 or 1):
+            self.overlay = None
+
+    def dump(self):
+        """write samples of the ring as json lines, returns filename"""
+        os.makedirs(self.dump_dir, exist_ok=True)
+        filename = os.path.join(
+            self.dump_dir,
+            datetime.now().strftime(f"%Y%m%d-%H%M%S-{self.frames}.jsonl"))
+        with open(filename, "w") as file:
+            for sample in self.ring:
+                file.write(json.dumps(sample) + "\n")
+        self.dump_after = self.frames + self.ring.maxlen
+        return filename
+
+    def get_overlay(self, font):
+        """surface with rolling means of the last frames,
+        rendered again a few times per window"""
+        if self.overlay is not None or not self.window:
+            return self.overlay
+        frames = len(self.window)
+
+        def mean(key, name=None):
+            return sum(sample[key] if name is None
+                       else sample[key].get(name, 0)
+                       for sample in self.window) / frames
+
+        lines = [f"frame {mean('ms'):6.2f} ms, "
+                 f"max {max(s['ms'] for s in self.window):.2f}"]
+        for stage in self.window[-1]["stages"]:
+            lines.append(f"{mean('stages', stage):6.2f}  {stage}")
+        probes = {name: mean("probes", name) for name in self.hot_paths}
+        for name in sorted(probes, key=probes.get, reverse=True):
+            if probes[name] >= .005:
+                lines.append(f"{probes[name]:6.2f}  {name}")
+        lines.append(" ".join(f"{name} {count}" for name, count in
+                              self.window[-1]["sprites"].items()))
+        lines.append(f"allocated blocks {mean('allocated_blocks'):+.0f}, "
+                     f"gc {mean('collections'):.2f} per frame")
+        images = [font.render(line, True, (255, 255, 255))
+                  for line in lines]
+        self.overlay = pg.Surface(
+            (max(image.get_width() for image in images) + 8,
+             sum(image.get_height() for image in images) + 8), pg.SRCALPHA)
+        self.overlay.fill((0, 0, 0, 160))
+        y = 4
+        for image in images:
+            self.overlay.blit(image, (4, y))
+            y += image.get_height()
+        return self.overlay
+
+
+PROFILER = Profiler()
+
+
+def get_camera_shift(world, display_w, display_h):
+    """[x, y] shift of the field on the screen following the player,
+    small field is centered"""
+    field_width = world.field_width
+    field_height = world.field_height
+    cam_shift = [0, 0]
+    player_x, player_y = world.player.get_center_position()
+    if field_width > display_w:
+        cam_shift[0] = max(min(display_w // 2 - player_x, BLOCK_WIDTH),
+                           -field_width + display_w - BLOCK_WIDTH)
+    else:
+        cam_shift[0] = display_w // 2 - field_width // 2
+    if field_height > display_h:
+        cam_shift[1] = max(min(display_h // 2 - player_y, BLOCK_HEIGHT),
+                           -field_height + display_h - BLOCK_HEIGHT)
+    else:
+        cam_shift[1] = display_h // 2 - field_height // 2
+    return cam_shift
+
+
+def main(replay_filename=None, fast=False):
+    """plays the game or, with replay_filename, shows the replay:
+    arrows seek it, space pauses it,
+    fast=True runs simulation as fast as possible"""
     pg.init()
     timer = pg.time.Clock()
     screen = pg.display.set_mode(DISPLAY)
 
-    # init sound subsystem and prepare some sounds
+    # init sound subsystem, sounds are loaded in background with sprites
     pg.mixer.init(44100, 16, 2)
-    sfx_back = pg.mixer.Sound(SOUND_THEME)
-    sfx_win = pg.mixer.Sound(SOUND_WIN)
-    sfx_fail = pg.mixer.Sound(SOUND_FAIL)
-    sfx_back.play(loops=-1)
-    sfx_back_playing = True
 
     backgroud_surface = pg.Surface(pg.display.list_modes()[0])
     backgroud_surface.fill(pg.Color(BACKGROUND_COLOR))
 
+    # splash sheet is taken from the bundle (or the cache) too,
+    # the loader thread gets the same mapped bundle
+    bundle = open_bundle()
+    splash_tile = SpriteSheet(SPLASH_SPRITES_FILENAME,
+                              width=14 * BLOCK_WIDTH,
+                              cache_dir=ATLAS_CACHE_DIR,
+                              bundle=bundle).view_table(
+        (0, 0, BLOCK_WIDTH, BLOCK_HEIGHT), 22, 14,
+        colorkey=pg.Color("#388700"))
+    pg.display.set_caption("Demolition expert")
+    pg.display.set_icon(splash_tile[0][5])
+    anim_icon = cycle(splash_tile[2][:7])
+
+    assets = {}
+    loader = threading.Thread(target=load_assets, args=(assets, bundle),
+                              daemon=True)
+    loader.start()
+    while loader.is_alive():
+        for event in pg.event.get():
+            if event.type == pg.QUIT:
+                raise SystemExit
+        screen.blit(backgroud_surface, (0, 0))
+        icon = next(anim_icon)
+        screen.blit(icon, icon.get_rect(center=screen.get_rect().center))
+        pg.display.update()
+        loader.join(1 / ANIMATION_RATE)
+    if "error" in assets:
+        raise assets["error"]
+
+    SOUNDS.play(SOUND_THEME, "music", loops=-1)
+    sfx_back_playing = True
+
     font = pg.font.Font(None, 100)
     win_screen = font.render(
                         "YOU WIN!", True, (50, 255, 50))
     fail_screen = font.render(
                         "YOU FAILED!", True, (255, 50, 50))
-
-    ss = SpriteSheet(SPRITES_FILENAME)
-    sprites_tile = ss.load_table((0, 0, BLOCK_WIDTH, BLOCK_HEIGHT),
-                                 22, 14,
-                                 colorkey=pg.Color("#388700"))
-
-    pg.display.set_caption("Demolition expert")
-    pg.display.set_icon(sprites_tile[0][5])
-    anim_icon = cycle(sprites_tile[2][:7])
-
-    blocks_group = ShiftableSpriteGroup()
-    bombs_group = ShiftableSpriteGroup()
-    explosions_group = ShiftableSpriteGroup()
-    actors_group = ShiftableSpriteGroup()
-
-    player = None
-    field_height = len(DEMO_FIELD.split('\n')) * BLOCK_HEIGHT
-    field_width = max(map(len, DEMO_FIELD
-                          .replace('\r', '')
-                          .replace(' ', '')
-                          .split('\n'))) * BLOCK_WIDTH
-
-    x = y = 0
-    for row in DEMO_FIELD.replace('\r', '').split('\n'):
-        x = 0
-        for cell in row.strip():
-            block = None
-            if cell == '#':
-                block = WallBlock(x, y,
-                                  sprites_tile=sprites_tile)
-            elif cell == 'B':
-                block = BrickBlock(x, y,
-                                   sprites_tile=sprites_tile)
-            elif cell == '_' and not randint(0, BLOCKS_PROBABILITY):
-                block = BrickBlock(x, y,
-                                   sprites_tile=sprites_tile)
-            elif cell == 'P' and not player:
-                player = Player(x, y,
-                                sprites_tile=sprites_tile)
-            elif cell == 'q':
-                bombs_group.add(Bomb(x, y,
-                                     sprites_tile=sprites_tile,
-                                     timer=5,
-                                     radius=1))
-            elif cell == 'Q':
-                bombs_group.add(Bomb(x, y,
-                                     sprites_tile=sprites_tile,
-                                     timer=25,
-                                     radius=5))
-            elif cell == 'b':
-                actors_group.add(Ballom(x, y,
-                                        sprites_tile=sprites_tile))
-            elif cell == 'o':
-                actors_group.add(Onil(x, y,
-                                      sprites_tile=sprites_tile))
-            elif cell == 'd':
-                actors_group.add(Dahl(x, y,
-                                      sprites_tile=sprites_tile))
-            elif cell == 'r':
-                actors_group.add(Doria(x, y,
-                                       sprites_tile=sprites_tile))
-            if block:
-                blocks_group.add(block)
-            x += BLOCK_WIDTH
-        y += BLOCK_HEIGHT
-
-    field_center = (field_width // 2 - BLOCK_WIDTH // 2,
-                    field_height // 2 - BLOCK_HEIGHT // 2)
-
-    if player is None:
-        player = Player(*field_center, sprites_tile=sprites_tile)
-    actors_group.add(player)
+    profile_font = pg.font.Font(None, 20)
+
+    sprites_tile = assets["atlas"].sprites_tile
+
+    replay = recorder = None
+    if replay_filename:
+        replay = Replay(replay_filename)
+        world = replay.make_world(sprites_tile)
+        paused = False
+        SOUNDS.muted = fast
+    else:
+        world = World(DEMO_FIELD, sprites_tile,
+                      seed=random.randrange(2 ** 32))
+        if REPLAY_RECORD and FIXED_TIMESTEP:
+            recorder = ReplayWriter.create(REPLAY_DIR, world)
+            atexit.register(recorder.close)
+    blocks_group = world.blocks_group
+    bombs_group = world.bombs_group
+    explosions_group = world.explosions_group
+    actors_group = world.actors_group
 
     horizontal = vertical = 0
     action = False
 
+    groups = {"blocks": blocks_group,
+              "bombs": bombs_group,
+              "explosions": explosions_group,
+              "actors": actors_group}
+
+    def draw_frame(splash_groups, overlay, overlay_rect, profile_overlay):
+        """draw everything onto the screen (inside of its clip)"""
+        screen.blit(backgroud_surface, (0, 0))
+        for splash_group in splash_groups:
+            splash_group.draw(screen)
+        blocks_group.draw(screen)
+        bombs_group.draw(screen)
+        explosions_group.draw(screen)
+        actors_group.draw(screen)
+        if overlay:
+            screen.blit(overlay, overlay_rect)
+        if profile_overlay:
+            screen.blit(profile_overlay, PROFILE_OVERLAY_POSITION)
+
+    # milliseconds of not simulated yet time for fixed timestep
+    lag = 0
+
+    # what was on the screen at the previous frame for dirty rects render
+    last_view = last_overlay_rect = last_profile_rect = None
+    last_changing_rects = []
+
+    if PROFILE:
+        PROFILER.enable()
+
+    # the first frame is not held back by the cap of the time since
+    # the clock start, it comes as soon as the assets are loaded
+    framerate = 0
+
     while True:
 
-        milliseconds = timer.tick(30)
+        milliseconds = timer.tick(framerate)
+        # fast-forward is not capped
+        framerate = 0 if fast else 30
+        PROFILER.begin_frame()
 
         for event in pg.event.get():
             if event.type == pg.QUIT:
@@ -775,94 +3016,138 @@ def main():
                     vertical = 1
                 if event.key == pg.K_SPACE:
                     action = True
+                if event.key == PROFILE_KEY:
+                    PROFILER.toggle()
+                if replay and event.key in (pg.K_LEFT, pg.K_RIGHT):
+                    seek = REPLAY_SEEK_TICKS
+                    if event.key == pg.K_LEFT:
+                        seek = -seek
+                    replay.seek(world, world.ticks + seek)
+                    last_view = None
+                if replay and event.key == pg.K_SPACE:
+                    paused = not paused
             if event.type == pg.KEYUP:
                 if event.key == pg.K_LEFT or event.key == pg.K_RIGHT:
                     horizontal = 0
                 if event.key == pg.K_UP or event.key == pg.K_DOWN:
                     vertical = 0
+        PROFILER.lap("events")
+
+        if replay and fast:
+            # as many ticks as fit into a frame, the screen is for progress
+            deadline = pg.time.get_ticks() + FRAME_BUDGET
+            while not paused and pg.time.get_ticks() < deadline and \
+                    replay.play(world, 1):
+                pass
+        elif replay:
+            lag = min(lag + milliseconds, MAX_TICKS_PER_FRAME * TICK_TIME)
+            while lag >= replay.tick_time:
+                if not paused:
+                    replay.play(world, 1)
+                lag -= replay.tick_time
+        elif FIXED_TIMESTEP:
+            lag = min(lag + milliseconds, MAX_TICKS_PER_FRAME * TICK_TIME)
+            while lag >= TICK_TIME:
+                controls = Controls(horizontal, vertical, action)
+                if recorder:
+                    recorder.record(world, controls)
+                world.step(TICK_TIME, controls)
+                # bomb is planted once per key press
+                action = False
+                lag -= TICK_TIME
+        else:
+            world.step(milliseconds, Controls(horizontal, vertical, action))
+            action = False
+        PROFILER.lap("simulation")
 
-        ret = player.update(milliseconds,
-                            (blocks_group, bombs_group, actors_group),
-                            horizontal,
-                            vertical,
-                            action,
-                            directcall=True)
-        blocks_group.update(milliseconds)
-        bombs_group.update(milliseconds)
-        explosions_group.update(milliseconds, (blocks_group,
-                                               actors_group,
-                                               bombs_group))
-        actors_group.update(milliseconds,
-                            (blocks_group, bombs_group, actors_group))
-
-        if ret:
-            if isinstance(ret, Bomb):
-                bombs_group.add(ret)
-
-        cam_shift = [0, 0]
         display_w = pg.display.Info().current_w
         display_h = pg.display.Info().current_h
-        player_x, player_y = player.get_center_position()
-        if field_width > display_w:
-            cam_shift[0] = max(min(display_w // 2 - player_x, BLOCK_WIDTH),
-                               -field_width + display_w - BLOCK_WIDTH)
-        else:
-            cam_shift[0] = display_w // 2 - field_width // 2
-        if field_height > display_h:
-            cam_shift[1] = max(min(display_h // 2 - player_y, BLOCK_HEIGHT),
-                               -field_height + display_h - BLOCK_HEIGHT)
-        else:
-            cam_shift[1] = display_h // 2 - field_height // 2
-
-        screen.blit(backgroud_surface, (0, 0))
-
-        for bomb in bombs_group:
-            if bomb.is_exploded():
-                explosion = bomb.get_explosion()
-                explosion.set_blocking_groups((blocks_group, bombs_group))
-                explosions_group.add(explosion)
+        cam_shift = get_camera_shift(world, display_w, display_h)
 
+        splash_groups = []
         for explosion in explosions_group:
             splash_group = explosion.get_splash_group()
             cam_shift[0] += randint(-1, 1)
             cam_shift[1] += randint(-1, 1)
             splash_group.set_view_shift(*cam_shift)
-            splash_group.draw(screen)
-
-        action = False
+            splash_groups.append(splash_group)
 
         blocks_group.set_view_shift(*cam_shift)
         bombs_group.set_view_shift(*cam_shift)
         explosions_group.set_view_shift(*cam_shift)
         actors_group.set_view_shift(*cam_shift)
 
-        blocks_group.draw(screen)
-        bombs_group.draw(screen)
-        explosions_group.draw(screen)
-        actors_group.draw(screen)
-
-        if not player.is_alive():
+        overlay = None
+        if world.is_failed():
             if sfx_back_playing:
                 sfx_back_playing = False
-                sfx_back.fadeout(25)
-                sfx_win.fadeout(25)
-                sfx_fail.play()
-            screen.blit(fail_screen,
-                        (display_w // 2 - fail_screen.get_width() // 2,
-                         display_h // 2 - fail_screen.get_height() // 2))
-
-        elif not blocks_group.contains_sprite_of_class(BrickBlock) and \
-                len(actors_group) == 1:
+                SOUNDS.fadeout("music", 25)
+                SOUNDS.play(SOUND_FAIL, "music")
+            overlay = fail_screen
+
+        elif world.is_won():
             if sfx_back_playing:
                 sfx_back_playing = False
-                sfx_back.fadeout(25)
-                sfx_win.play()
-            screen.blit(win_screen,
-                        (display_w // 2 - win_screen.get_width() // 2,
-                         display_h // 2 - win_screen.get_height() // 2))
-
-        pg.display.update()
+                SOUNDS.fadeout("music", 25)
+                SOUNDS.play(SOUND_WIN, "music")
+            overlay = win_screen
+
+        overlay_rect = None
+        if overlay:
+            overlay_rect = overlay.get_rect(center=(display_w // 2,
+                                                    display_h // 2))
+
+        profile_overlay = profile_rect = None
+        if PROFILER.enabled:
+            profile_overlay = PROFILER.get_overlay(profile_font)
+        if profile_overlay:
+            profile_rect = profile_overlay.get_rect(
+                topleft=PROFILE_OVERLAY_POSITION)
+
+        view = (tuple(cam_shift), (display_w, display_h),
+                [group.view_shift for group in splash_groups])
+        changing_rects = []
+        if DIRTY_RECTS:
+            for group in splash_groups + [bombs_group,
+                                          explosions_group,
+                                          actors_group]:
+                changing_rects += group.get_screen_rects(screen)
+
+        PROFILER.lap("camera")
+
+        if not DIRTY_RECTS or view != last_view:
+            # camera moved, everything on the screen is changed
+            draw_frame(splash_groups, overlay, overlay_rect,
+                       profile_overlay)
+            PROFILER.lap("draw")
+            pg.display.update()
+        else:
+            # old and new places of animated sprites and changed blocks
+            dirty_rects = last_changing_rects + changing_rects + \
+                blocks_group.get_dirty_screen_rects()
+            if overlay_rect != last_overlay_rect:
+                dirty_rects.append(overlay_rect or last_overlay_rect)
+            # profiler overlay is changing
+            dirty_rects += [rect for rect in (profile_rect,
+                                              last_profile_rect) if rect]
+            for rect in dirty_rects:
+                screen.set_clip(rect)
+                draw_frame(splash_groups, overlay, overlay_rect,
+                           profile_overlay)
+            screen.set_clip(None)
+            PROFILER.lap("draw")
+            pg.display.update(dirty_rects)
+        PROFILER.lap("present")
+
+        last_view = view
+        last_changing_rects = changing_rects
+        last_overlay_rect = overlay_rect
+        last_profile_rect = profile_rect
+        # fast-forward frames are over budget on purpose
+        PROFILER.end_frame(groups, None if fast else FRAME_BUDGET)
 
 
 if __name__ == "__main__":
-    main()
+    # main.py [--fast] [replay.dxr]
+    args = [arg for arg in sys.argv[1:] if arg != "--fast"]
+    main(*args[:1], fast="--fast" in sys.argv)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""runs batches of headless matches on all cores
+and prints results as csv lines while they come
+
+    $ python3 match_runner.py [matches count] [workers] > results.csv
+"""
+
+import multiprocessing
+import os
+import random
+import sys
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import main
+
+ENEMIES_CHARS = "bodr"
+# matches sent to a worker at once
+CHUNK_SIZE = 16
+# chunks waiting in the pool queue per worker
+CHUNKS_PER_WORKER = 2
+# lost attempts before a chunk is split into single matches
+# or a single match is reported as crashed
+MAX_ATTEMPTS = 2
+
+# slot of the pool worker process in the shared array of match_id + 1
+# of matches played by workers (0 - none), set by init_worker()
+worker_slot = None
+worker_progress = None
+
+Match = namedtuple("Match", "match_id width height blocks_probability "
+                            "enemies seed max_ticks")
+MatchResult = namedtuple("MatchResult", "match_id outcome ticks "
+                                        "bricks_destroyed enemies_killed "
+                                        "bombs_used")
+
+
+def make_matches(count, seed=None, max_ticks=30 * 60 * 3):
+    """random fields of make_level() with different sizes,
+    blocks probabilities and enemies mixes"""
+    rng = random.Random(seed)
+    for match_id in range(count):
+        enemies = ''.join(rng.choice(ENEMIES_CHARS)
+                          for _ in range(rng.randint(0, 10)))
+        yield Match(match_id,
+                    rng.randrange(11, 32, 2),
+                    rng.randrange(11, 32, 2),
+                    rng.randint(1, 6),
+                    enemies,
+                    rng.getrandbits(64),
+                    max_ticks)
+
+
+def random_bot(world, rng):
+    """walks randomly and plants a bomb sometimes"""
+    return main.Controls(rng.randint(-1, 1),
+                         rng.randint(-1, 1),
+                         not rng.randint(0, 50))
+
+
+def run_match(match, bot=random_bot):
+    """plays the match till the end, bot(world, rng) gives controls"""
+    rng = random.Random(match.seed)
+    field = main.place_enemies(main.make_level(match.width, match.height),
+                               match.enemies, rng)
+    world = main.World(field, seed=match.seed,
+                       blocks_probability=match.blocks_probability)
+
+    outcome = "timeout"
+    while world.ticks < match.max_ticks:
+        world.step(main.TICK_TIME, bot(world, rng))
+        if world.is_failed():
+            outcome = "failed"
+            break
+        if world.is_won():
+            outcome = "won"
+            break
+
+    counts = world.events.counts
+    return MatchResult(match.match_id, outcome, world.ticks,
+                       counts[main.EVENT_BRICK_DESTROYED],
+                       counts[main.EVENT_ENEMY_DIED],
+                       world.bombs_planted)
+
+
+def init_worker(progress, slots):
+    """takes the next free slot of the pool progress array"""
+    global worker_slot, worker_progress
+    with slots.get_lock():
+        worker_slot = slots.value
+        slots.value += 1
+    worker_progress = progress
+
+
+def make_pool(workers):
+    """returns pool of workers and array of matches played by them"""
+    progress = multiprocessing.Array("q", workers)
+    pool = ProcessPoolExecutor(workers, initializer=init_worker,
+                               initargs=(progress,
+                                         multiprocessing.Value("i", 0)))
+    return pool, progress
+
+
+def run_chunk(matches, bot=random_bot):
+    """results of matches, failed by exception one gets "error" outcome"""
+    results = []
+    for match in matches:
+        if worker_progress is not None:
+            worker_progress[worker_slot] = match.match_id + 1
+        try:
+            results.append(run_match(match, bot))
+        except Exception:
+            results.append(MatchResult(match.match_id, "error", 0, 0, 0, 0))
+    if worker_progress is not None:
+        worker_progress[worker_slot] = 0
+    return results
+
+
+def get_chunks(matches, size):
+    chunk = []
+    for match in matches:
+        chunk.append(match)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_matches(matches, bot=random_bot, workers=None,
+                chunk_size=CHUNK_SIZE):
+    """yields MatchResult() of every match in order of completion.
+    Matches are sent to the pool of worker processes by chunks,
+    only a few chunks per worker are queued at once.
+    When a worker dies the pool is restarted and its unfinished chunks
+    are sent again. Matches played by workers at that moment are taken
+    out of them and played one by one in separate process, so the match
+    killing its worker is found and gets "crashed" outcome after
+    MAX_ATTEMPTS, while co-running ones do not lose attempts.
+    Chunks lost with no match played (MAX_ATTEMPTS times) are split
+    into such single matches"""
+    workers = workers or os.cpu_count()
+    chunks = get_chunks(matches, chunk_size)
+    pool, progress = make_pool(workers)
+    isolation = ProcessPoolExecutor(1)
+    # future: (chunk, attempts)
+    running = {}
+    retries = []
+    # future: (match, attempts) of the isolated match
+    isolated = {}
+    suspects = deque()
+    try:
+        while True:
+            while len(running) < workers * CHUNKS_PER_WORKER:
+                if retries:
+                    chunk, attempts = retries.pop()
+                else:
+                    chunk, attempts = next(chunks, None), 0
+                    if chunk is None:
+                        break
+                try:
+                    running[pool.submit(run_chunk, chunk, bot)] = \
+                        chunk, attempts
+                except BrokenProcessPool:
+                    # its running futures will tell about it
+                    retries.append((chunk, attempts))
+                    break
+            if suspects and not isolated:
+                match, attempts = suspects.popleft()
+                isolated[isolation.submit(run_chunk, [match], bot)] = \
+                    match, attempts
+            if not running and not isolated:
+                if not retries:
+                    break
+                pool.shutdown(wait=False)
+                pool, progress = make_pool(workers)
+                continue
+
+            done, _ = wait(list(running) + list(isolated),
+                           return_when=FIRST_COMPLETED)
+            lost = []
+            for future in done:
+                if future in isolated:
+                    match, attempts = isolated.pop(future)
+                    try:
+                        yield from future.result()
+                    except BrokenProcessPool:
+                        isolation.shutdown(wait=False)
+                        isolation = ProcessPoolExecutor(1)
+                        if attempts + 1 < MAX_ATTEMPTS:
+                            suspects.appendleft((match, attempts + 1))
+                        else:
+                            yield MatchResult(match.match_id, "crashed",
+                                              0, 0, 0, 0)
+                    continue
+                try:
+                    results = future.result()
+                except BrokenProcessPool:
+                    lost.append(running.pop(future))
+                    continue
+                del running[future]
+                yield from results
+
+            if lost:
+                # the whole pool is broken, nothing else comes from it
+                for future, chunk_attempts in running.items():
+                    if future.done() and future.exception() is None:
+                        yield from future.result()
+                    else:
+                        lost.append(chunk_attempts)
+                running.clear()
+                played = {match_id - 1 for match_id in progress if match_id}
+                pool.shutdown(wait=False)
+                pool, progress = make_pool(workers)
+                if any(match.match_id in played
+                       for chunk, _ in lost for match in chunk):
+                    # the killer is one of the played matches,
+                    # others are sent again without lost attempts
+                    for chunk, attempts in lost:
+                        suspects.extend((match, 0) for match in chunk
+                                        if match.match_id in played)
+                        rest = [match for match in chunk
+                                if match.match_id not in played]
+                        if rest:
+                            retries.append((rest, attempts))
+                else:
+                    for chunk, attempts in lost:
+                        if attempts + 1 < MAX_ATTEMPTS:
+                            retries.append((chunk, attempts + 1))
+                        else:
+                            suspects.extend((match, 0) for match in chunk)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        isolation.shutdown(wait=False, cancel_futures=True)
+
+
+def run():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    print(','.join(MatchResult._fields))
+    for result in run_matches(make_matches(count, seed=1), workers=workers):
+        print(','.join(map(str, result)), flush=True)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,498 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""enemies kept in numpy arrays (struct of arrays) and updated
+in vectorized batches for stress levels with thousands of them.
+Needs numpy (the game itself does not).
+
+    >>> world = SwarmWorld(main.place_enemies(main.make_level(201, 201),
+    ...                                       "bodr" * 1000, rng))
+    >>> world.step(main.TICK_TIME, controls)
+
+Moves, flow field policies, collisions with tiles, bombs, the player
+and each other, animations, deaths and contact kills follow
+Enemy.update() rules. Enemies of the swarm collide with positions
+of each other before the tick (sprites see already moved ones)
+and take random numbers from own generator, so the game goes
+not the same way as with sprites.
+"""
+
+import copy
+
+import numpy as np
+import pygame as pg
+
+import main
+
+KINDS = (main.Ballom, main.Onil, main.Dahl, main.Doria)
+# animations of directions in Enemy.update() order
+ANIMATIONS = ("anim_right", "anim_left", "anim_down", "anim_up")
+# FlowField.directions as arrays
+DX = np.array([dx for dx, _ in main.FlowField.directions])
+DY = np.array([dy for _, dy in main.FlowField.directions])
+# Actor.collide() counts collisions found in the previous groups
+# again for every next group of (blocks, bombs, actors)
+BLOCK_PUSH, BOMB_PUSH, ACTOR_PUSH = 3, 2, 1
+# offsets of 3x3 cells around a cell
+NEAR_DX = np.array([-1, 0, 1] * 3)
+NEAR_DY = np.repeat([-1, 0, 1], 3)
+
+
+def lookup(grid, columns, rows, default):
+    """values of grid cells, default for cells out of the grid"""
+    height, width = grid.shape
+    inside = (columns >= 0) & (columns < width) & \
+        (rows >= 0) & (rows < height)
+    values = grid[np.clip(rows, 0, height - 1),
+                  np.clip(columns, 0, width - 1)]
+    return np.where(inside, values, default)
+
+
+def get_overlapped_cells(x, y):
+    """(columns, rows, overlapped) of up to four field cells
+    overlapped by every block sized rect"""
+    left = x // main.BLOCK_WIDTH
+    right = (x + main.BLOCK_WIDTH - 1) // main.BLOCK_WIDTH
+    top = y // main.BLOCK_HEIGHT
+    bottom = (y + main.BLOCK_HEIGHT - 1) // main.BLOCK_HEIGHT
+    return ((left, top, True),
+            (right, top, right != left),
+            (left, bottom, bottom != top),
+            (right, bottom, (right != left) & (bottom != top)))
+
+
+def get_contacts(x, y, others_x, others_y):
+    """(indexes, others indexes) of pairs of block sized rects at x*y
+    overlapping ones at others_x*others_y (of the same enemies),
+    found by buckets of field cells of the others and 3x3 cells
+    around every rect"""
+    # cells keys with a margin of one cell around
+    columns = x // main.BLOCK_WIDTH + 1
+    rows = y // main.BLOCK_HEIGHT + 1
+    others_columns = others_x // main.BLOCK_WIDTH + 1
+    others_rows = others_y // main.BLOCK_HEIGHT + 1
+    width = int(max(columns.max(), others_columns.max())) + 2
+    height = int(max(rows.max(), others_rows.max())) + 2
+    keys = others_rows * width + others_columns
+    order = np.argsort(keys, kind="stable")
+    counts = np.bincount(keys, minlength=width * height)
+    starts = np.cumsum(counts) - counts
+    # (rect, near cell) items of not empty cells of 3x3 around rects
+    near = ((rows[:, None] + NEAR_DY) * width +
+            columns[:, None] + NEAR_DX).ravel()
+    near_counts = counts[near]
+    taken = np.flatnonzero(near_counts)
+    near = near[taken]
+    near_counts = near_counts[taken]
+    indexes = np.repeat(taken // len(NEAR_DX), near_counts)
+    offsets = np.arange(len(indexes)) - \
+        np.repeat(np.cumsum(near_counts) - near_counts, near_counts)
+    others = order[np.repeat(starts[near], near_counts) + offsets]
+    overlapped = (indexes != others) & \
+        (x[indexes] < others_x[others] + main.WIDTH) & \
+        (x[indexes] + main.WIDTH > others_x[others]) & \
+        (y[indexes] < others_y[others] + main.HEIGHT) & \
+        (y[indexes] + main.HEIGHT > others_y[others])
+    return indexes[overlapped], others[overlapped]
+
+
+class SwarmEnemy:
+    """stand-in sprite of a swarm enemy for collisions of other actors"""
+    __slots__ = ("index", "rect")
+
+    def __init__(self, index, rect):
+        self.index = index
+        self.rect = rect
+
+
+class Crowd:
+    """actors group and enemies swarm as one group for collisions"""
+    static = False
+
+    def __init__(self, *groups):
+        self.groups = groups
+
+    def __iter__(self):
+        return iter(self.sprites())
+
+    def sprites(self):
+        return [spr for group in self.groups for spr in group.sprites()]
+
+    def get_sprites_in_rect(self, rect):
+        return [spr for group in self.groups
+                for spr in group.get_sprites_in_rect(rect)]
+
+
+class EnemySwarm:
+    """enemies of KINDS as arrays of positions, velocities,
+    alive flags, kinds, animations timeouts and positions,
+    images (indexes of self.images) and death frames left.
+    Kinds frames are taken from one enemy of every kind.
+    Quacks like ShiftableSpriteGroup() for collisions and drawing"""
+    static = False
+    arrays = ("x", "y", "xvel", "yvel", "alive", "kinds", "timeouts",
+              "positions", "image", "dying")
+
+    def __init__(self, enemies, sprites_tile, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.images = []
+        kinds_count = len(KINDS)
+        self.static_images = np.zeros(kinds_count, np.int64)
+        # per kind and direction: column of self.positions
+        # (Animation() objects shared by directions share it),
+        # the first frame in self.images and frames count
+        self.slots = np.zeros((kinds_count, len(ANIMATIONS)), np.int64)
+        self.starts = np.zeros((kinds_count, len(ANIMATIONS)), np.int64)
+        self.lengths = np.ones((kinds_count, len(ANIMATIONS)), np.int64)
+        die_images = []
+        for kind, cls in enumerate(KINDS):
+            prototype = cls(0, 0, sprites_tile)
+            self.static_images[kind] = len(self.images)
+            self.images.append(prototype.static_image)
+            # id(Animation()): (slot, start)
+            animations = {}
+            for direction, name in enumerate(ANIMATIONS):
+                animation = getattr(prototype, name)
+                if id(animation) not in animations:
+                    animations[id(animation)] = len(animations), \
+                        len(self.images)
+                    self.images += animation.frames
+                self.slots[kind, direction], self.starts[kind, direction] = \
+                    animations[id(animation)]
+                self.lengths[kind, direction] = len(animation.frames)
+            die_images.append(list(range(len(self.images),
+                                         len(self.images) +
+                                         len(prototype.anim_die))))
+            self.images += prototype.anim_die
+        self.die_images = np.zeros(
+            (kinds_count, max(map(len, die_images))), np.int64)
+        for kind, indexes in enumerate(die_images):
+            self.die_images[kind, :len(indexes)] = indexes
+        self.chases = np.array([cls.chases for cls in KINDS])
+        self.flees = np.array([cls.flees for cls in KINDS])
+
+        count = len(enemies)
+        self.x = np.array([enemy.rect.x for enemy in enemies], np.int64)
+        self.y = np.array([enemy.rect.y for enemy in enemies], np.int64)
+        self.xvel = np.array([enemy.xvel for enemy in enemies], np.int64)
+        self.yvel = np.array([enemy.yvel for enemy in enemies], np.int64)
+        self.alive = np.array([enemy.alive for enemy in enemies], bool)
+        self.kinds = np.array([KINDS.index(type(enemy))
+                               for enemy in enemies], np.int64)
+        self.timeouts = np.array([enemy.animation_timeout
+                                  for enemy in enemies], float)
+        self.positions = np.zeros((count, len(ANIMATIONS)), np.int64)
+        for index, enemy in enumerate(enemies):
+            for direction, name in enumerate(ANIMATIONS):
+                self.positions[index,
+                               self.slots[self.kinds[index], direction]] = \
+                    getattr(enemy, name).position
+        self.image = self.static_images[self.kinds]
+        self.dying = np.array([len(enemy.anim_die) for enemy in enemies],
+                              np.int64)
+        # FlowField() key and its grids of distances and dangers
+        self.flow_key = None
+        self.distances = self.dangers = None
+        self.view_shift = 0, 0
+
+    def __len__(self):
+        return len(self.x)
+
+    def sprites(self):
+        return [SwarmEnemy(index, pg.Rect(x, y, main.WIDTH, main.HEIGHT))
+                for index, (x, y) in enumerate(zip(self.x.tolist(),
+                                                   self.y.tolist()))]
+
+    def get_indexes_in_rect(self, rect):
+        return np.flatnonzero((self.x < rect.right) &
+                              (self.x + main.WIDTH > rect.left) &
+                              (self.y < rect.bottom) &
+                              (self.y + main.HEIGHT > rect.top))
+
+    def get_sprites_in_rect(self, rect):
+        return [SwarmEnemy(index, pg.Rect(self.x[index], self.y[index],
+                                          main.WIDTH, main.HEIGHT))
+                for index in self.get_indexes_in_rect(rect).tolist()]
+
+    def explode(self, blast_map, events=None):
+        """kill enemies touching cells of blast map"""
+        if not blast_map or not len(self):
+            return
+        cells = np.array(list(blast_map))
+        offset_column, offset_row = cells.min(axis=0)
+        grid = np.zeros((cells[:, 1].max() - offset_row + 1,
+                         cells[:, 0].max() - offset_column + 1), bool)
+        grid[cells[:, 1] - offset_row, cells[:, 0] - offset_column] = True
+        hit = np.zeros(len(self), bool)
+        for columns, rows, overlapped in get_overlapped_cells(self.x,
+                                                              self.y):
+            hit |= overlapped & lookup(grid, columns - offset_column,
+                                       rows - offset_row, False)
+        died = hit & self.alive
+        self.alive &= ~hit
+        if events:
+            for _ in range(int(died.sum())):
+                events.emit(main.EVENT_ENEMY_DIED)
+
+    def get_flow_grids(self, flow_field, columns, rows):
+        """grids of distances (-1 for unknown) and dangers of the flow
+        field, converted once per its change"""
+        if self.flow_key != flow_field.key:
+            self.flow_key = flow_field.key
+            self.distances = np.full((rows, columns), -1, np.int64)
+            self.dangers = np.zeros((rows, columns), bool)
+            for (column, row), distance in flow_field.distances.items():
+                if 0 <= column < columns and 0 <= row < rows:
+                    self.distances[row, column] = distance
+            for column, row in flow_field.dangers:
+                if 0 <= column < columns and 0 <= row < rows:
+                    self.dangers[row, column] = True
+        return self.distances, self.dangers
+
+    def get_flow_directions(self, indexes, passable, flow_field):
+        """(xvel, yvel) arrays of enemies on field cells
+        like Enemy.get_flow_direction()"""
+        rows, columns = passable.shape
+        distances, dangers = self.get_flow_grids(flow_field, columns, rows)
+        column = self.x[indexes] // main.BLOCK_WIDTH
+        row = self.y[indexes] // main.BLOCK_HEIGHT
+        kinds = self.kinds[indexes]
+        neighbours_columns = column[:, None] + DX
+        neighbours_rows = row[:, None] + DY
+        moves = lookup(passable, neighbours_columns, neighbours_rows, True)
+
+        flees = self.flees[kinds]
+        safe_moves = moves & ~lookup(dangers, neighbours_columns,
+                                     neighbours_rows, False)
+        in_danger = lookup(dangers, column, row, False)
+        escapes = np.where(safe_moves.any(axis=1)[:, None],
+                           safe_moves, moves)
+        moves = np.where(flees[:, None],
+                         np.where(in_danger[:, None], escapes, safe_moves),
+                         moves)
+
+        distance = lookup(distances, column, row, -1)
+        closer_moves = moves & (lookup(distances, neighbours_columns,
+                                       neighbours_rows, -1) ==
+                                (distance - 1)[:, None]) & \
+            (distance >= 1)[:, None]
+        moves = np.where((self.chases[kinds] &
+                          closer_moves.any(axis=1))[:, None],
+                         closer_moves, moves)
+
+        xvel = self.xvel[indexes]
+        yvel = self.yvel[indexes]
+        current = np.select([(xvel == dx) & (yvel == dy)
+                             for dx, dy in zip(DX, DY)],
+                            range(len(DX)), -1)
+        keep = (current >= 0) & \
+            moves[np.arange(len(indexes)), np.maximum(current, 0)]
+        chosen = np.where(moves, self.rng.random(moves.shape),
+                          -1).argmax(axis=1)
+        chosen = np.where(keep, current, chosen)
+        stuck = ~moves.any(axis=1)
+        return np.where(stuck, 0, DX[chosen]), np.where(stuck, 0, DY[chosen])
+
+    def update(self, time, world):
+        """Enemy.update() of all enemies at once,
+        dead ones are removed after theirs death animations"""
+        if not len(self):
+            return
+        blocks = world.blocks_group
+        tiles = np.frombuffer(blocks.tiles, np.uint8).reshape(blocks.rows,
+                                                              blocks.columns)
+        bombs = np.zeros_like(tiles, bool)
+        for column, row in world.bombs_group.cells:
+            if 0 <= column < blocks.columns and 0 <= row < blocks.rows:
+                bombs[row, column] = True
+        x, y, xvel, yvel, alive = \
+            self.x, self.y, self.xvel, self.yvel, self.alive
+
+        # directions by the flow field on field cells, random when stopped
+        decided = np.zeros(len(self), bool)
+        policy = alive & (self.chases | self.flees)[self.kinds] & \
+            (x % main.BLOCK_WIDTH == 0) & (y % main.BLOCK_HEIGHT == 0)
+        if policy.any():
+            indexes = np.flatnonzero(policy)
+            xvel[indexes], yvel[indexes] = self.get_flow_directions(
+                indexes, (tiles == main.TILE_EMPTY) & ~bombs,
+                world.flow_field)
+            decided[indexes] = True
+        stopped = ~decided & (xvel == 0) & (yvel == 0)
+        if stopped.any():
+            indexes = np.flatnonzero(stopped)
+            horizontal = self.rng.integers(0, 2, len(indexes)).astype(bool)
+            velocity = self.rng.integers(-1, 2, len(indexes))
+            xvel[indexes[horizontal]] = velocity[horizontal]
+            yvel[indexes[~horizontal]] = velocity[~horizontal]
+        xvel[~alive] = 0
+        yvel[~alive] = 0
+
+        # animations
+        self.timeouts += time
+        fired = self.timeouts / 1000 >= 1 / main.ANIMATION_RATE
+        killed = np.zeros(len(self), bool)
+        if fired.any():
+            self.timeouts[fired] = 0
+            direction = np.select([xvel > 0, xvel < 0, yvel > 0, yvel < 0],
+                                  range(len(ANIMATIONS)), -1)
+            moving = np.flatnonzero(fired & (direction >= 0))
+            kinds = self.kinds[moving]
+            slots = self.slots[kinds, direction[moving]]
+            positions = self.positions[moving, slots]
+            self.image[moving] = self.starts[kinds, direction[moving]] + \
+                positions
+            self.positions[moving, slots] = \
+                (positions + 1) % self.lengths[kinds, direction[moving]]
+            still = fired & (direction < 0)
+            self.image[still] = self.static_images[self.kinds[still]]
+            dead = fired & ~alive
+            killed = dead & (self.dying == 0)
+            popped = np.flatnonzero(dead & (self.dying > 0))
+            self.image[popped] = self.die_images[self.kinds[popped],
+                                                 self.dying[popped] - 1]
+            self.dying[popped] -= 1
+
+        old_x = x.copy()
+        old_y = y.copy()
+        x += xvel * main.MOVE_SPEED
+        y += yvel * main.MOVE_SPEED
+
+        # collisions with tiles, bombs, the player and enemies push back
+        weights = (tiles != main.TILE_EMPTY) * BLOCK_PUSH + bombs * BOMB_PUSH
+        push_h = np.zeros(len(self), np.int64)
+        push_v = np.zeros(len(self), np.int64)
+        collided = np.zeros(len(self), bool)
+        for columns, rows, overlapped in get_overlapped_cells(x, y):
+            weight = overlapped * lookup(weights, columns, rows, 0)
+            push_h += weight * np.sign(x - columns * main.BLOCK_WIDTH)
+            push_v += weight * np.sign(y - rows * main.BLOCK_HEIGHT)
+            collided |= weight > 0
+        player = world.player.rect
+        touched = (x < player.right) & (x + main.WIDTH > player.left) & \
+            (y < player.bottom) & (y + main.HEIGHT > player.top)
+        push_h += touched * ACTOR_PUSH * np.sign(x - player.x)
+        push_v += touched * ACTOR_PUSH * np.sign(y - player.y)
+        collided |= touched
+        indexes, others = get_contacts(x, y, old_x, old_y)
+        np.add.at(push_h, indexes, ACTOR_PUSH * np.sign(x[indexes] -
+                                                        old_x[others]))
+        np.add.at(push_v, indexes, ACTOR_PUSH * np.sign(y[indexes] -
+                                                        old_y[others]))
+        collided[indexes] = True
+        x += np.sign(push_h) * main.MOVE_SPEED
+        y += np.sign(push_v) * main.MOVE_SPEED
+        xvel[collided] = 0
+        yvel[collided] = 0
+        if touched.any():
+            world.player.exploded()
+
+        if killed.any():
+            self.keep(~killed)
+
+    def keep(self, mask):
+        """drop enemies out of mask"""
+        for name in self.arrays:
+            setattr(self, name, getattr(self, name)[mask])
+
+    def snapshot(self):
+        return ({name: getattr(self, name).copy() for name in self.arrays},
+                self.rng.bit_generator.state)
+
+    def restore(self, values):
+        arrays, self.rng.bit_generator.state = values
+        for name, array in arrays.items():
+            setattr(self, name, array.copy())
+
+    def clone(self):
+        clone = copy.copy(self)
+        clone.rng = np.random.default_rng()
+        clone.restore(self.snapshot())
+        return clone
+
+    def get_state(self):
+        """plain values for SwarmWorld().get_state()"""
+        return {"arrays": {name: getattr(self, name).tolist()
+                           for name in self.arrays},
+                "rng": self.rng.bit_generator.state}
+
+    def set_state(self, state):
+        for name, values in state["arrays"].items():
+            setattr(self, name,
+                    np.array(values, getattr(self, name).dtype).reshape(
+                        -1, *getattr(self, name).shape[1:]))
+        self.rng.bit_generator.state = state["rng"]
+
+    def set_view_shift(self, x, y):
+        """set shift of "camera" """
+        self.view_shift = x, y
+
+    def get_visible(self, surface):
+        shift_x, shift_y = self.view_shift
+        return self.get_indexes_in_rect(
+            surface.get_clip().move(-shift_x, -shift_y))
+
+    def get_screen_rects(self, surface):
+        """returns rects of enemies visible on the surface
+        (for dirty rects rendering)"""
+        shift_x, shift_y = self.view_shift
+        visible = self.get_visible(surface)
+        return [pg.Rect(x + shift_x, y + shift_y, main.WIDTH, main.HEIGHT)
+                for x, y in zip(self.x[visible].tolist(),
+                                self.y[visible].tolist())]
+
+    def draw(self, surface):
+        """draw enemies visible inside of the surface clip
+        by one batch of blits"""
+        shift_x, shift_y = self.view_shift
+        visible = self.get_visible(surface)
+        images = self.images
+        surface.blits([(images[image], (x + shift_x, y + shift_y))
+                       for image, x, y in zip(self.image[visible].tolist(),
+                                              self.x[visible].tolist(),
+                                              self.y[visible].tolist())],
+                      False)
+
+
+class SwarmWorld(main.World):
+    """World() with enemies of the field in EnemySwarm()"""
+    def load_field(self, field):
+        super().load_field(field)
+        enemies = [actor for actor in self.actors_group
+                   if isinstance(actor, main.Enemy)]
+        self.actors_group.remove(enemies)
+        self.swarm = EnemySwarm(enemies, self.sprites_tile,
+                                seed=self.rng.getrandbits(64))
+
+    def get_colliding_groups(self):
+        return self.blocks_group, self.bombs_group, \
+            Crowd(self.actors_group, self.swarm)
+
+    def update_enemies(self, time, blast_map, groups):
+        self.swarm.explode(blast_map, self.events)
+        super().update_enemies(time, blast_map, groups)
+        self.swarm.update(time, self)
+
+    def snapshot(self):
+        return super().snapshot(), self.swarm.snapshot()
+
+    def restore(self, snapshot):
+        world_snapshot, swarm_snapshot = snapshot
+        super().restore(world_snapshot)
+        self.swarm.restore(swarm_snapshot)
+
+    def clone(self):
+        clone = super().clone()
+        clone.swarm = self.swarm.clone()
+        return clone
+
+    def get_state(self):
+        state = super().get_state()
+        state["swarm"] = self.swarm.get_state()
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.swarm.set_state(state["swarm"])
+
+    def is_won(self):
+        return super().is_won() and not len(self.swarm)
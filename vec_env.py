@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""N independent headless games stepped in lockstep for agents training.
+Needs numpy (the game itself does not).
+
+    >>> envs = VecEnv(64)
+    >>> observations = envs.reset()
+    >>> actions = numpy.zeros((64, 3), dtype=numpy.int8)
+    >>> observations, rewards, dones = envs.step(actions)
+"""
+
+import random
+
+import numpy as np
+import main
+
+# observations channels
+CHANNELS = ("walls", "bricks", "bombs", "blasts", "player", "enemies")
+WALLS, BRICKS, BOMBS, BLASTS, PLAYER, ENEMIES = range(len(CHANNELS))
+
+ENEMIES_CHARS = "bodr"
+
+REWARD_BRICK = 1.
+REWARD_ENEMY = 5.
+REWARD_WIN = 10.
+REWARD_FAIL = -10.
+
+
+class VecEnv:
+    """count games on make_level(width, height) fields with enemies.
+    step() takes (count, 3) array of horizontal, vertical (-1, 0, 1)
+    and action (0, 1) and returns observations (count, channels, rows,
+    columns) of uint8 0/1 grids, float32 rewards and bool dones.
+    Finished game (won, failed or max_ticks long) is reset at once:
+    its done is True and its observation is of the new level.
+    Returned arrays are reused by the next step()"""
+    def __init__(self, count, width=15, height=15, enemies=3,
+                 max_ticks=30 * 60 * 3, seed=None):
+        self.count = count
+        self.width = width
+        self.height = height
+        self.enemies = enemies
+        self.max_ticks = max_ticks
+        self.rng = random.Random(seed)
+        self.worlds = [None] * count
+        # bricks and enemies left for rewards
+        self.bricks = [0] * count
+        self.actors = [0] * count
+        # make_level() adds a column to even widths, so the grid is
+        # sized by the built field
+        tiles = main.World(main.make_level(width, height)).blocks_group
+        self.observations = np.zeros((count, len(CHANNELS),
+                                      tiles.rows, tiles.columns), np.uint8)
+        self.rewards = np.zeros(count, np.float32)
+        self.dones = np.zeros(count, bool)
+
+    def reset_env(self, index):
+        """new level with new random bricks and enemies"""
+        enemies = ''.join(self.rng.choice(ENEMIES_CHARS)
+                          for _ in range(self.enemies))
+        field = main.place_enemies(main.make_level(self.width, self.height),
+                                   enemies, self.rng)
+        world = self.worlds[index] = main.World(
+            field, seed=self.rng.getrandbits(64))
+        self.bricks[index] = world.blocks_group.counts[main.TILE_BRICK]
+        self.actors[index] = len(world.actors_group)
+
+    def reset(self):
+        for index in range(self.count):
+            self.reset_env(index)
+        return self.observe()
+
+    def step(self, actions):
+        rewards = self.rewards
+        dones = self.dones
+        dones[:] = False
+        for index, (horizontal, vertical, action) in \
+                enumerate(np.asarray(actions).tolist()):
+            world = self.worlds[index]
+            world.step(main.TICK_TIME,
+                       main.Controls(horizontal, vertical, action))
+
+            bricks = world.blocks_group.counts[main.TILE_BRICK]
+            actors = len(world.actors_group)
+            reward = REWARD_BRICK * (self.bricks[index] - bricks) + \
+                REWARD_ENEMY * (self.actors[index] - actors)
+            self.bricks[index] = bricks
+            self.actors[index] = actors
+
+            if world.is_failed():
+                reward += REWARD_FAIL
+                dones[index] = True
+            elif world.is_won():
+                reward += REWARD_WIN
+                dones[index] = True
+            elif world.ticks >= self.max_ticks:
+                dones[index] = True
+            rewards[index] = reward
+            if dones[index]:
+                self.reset_env(index)
+        return self.observe(), rewards, dones
+
+    def observe(self):
+        """fill observations grids of all games at once:
+        tiles are converted in one numpy operation,
+        sprites are scattered by lists of theirs cells"""
+        observations = self.observations
+        count, _, rows, columns = observations.shape
+        tiles = np.frombuffer(
+            b"".join(world.blocks_group.tiles.tobytes()
+                     for world in self.worlds),
+            np.uint8).reshape(count, rows, columns)
+        observations[:] = 0
+        observations[:, WALLS] = tiles == main.TILE_WALL
+        observations[:, BRICKS] = tiles == main.TILE_BRICK
+
+        # (game, channel, row, column) of every sprite
+        cells = [], [], [], []
+        for index, world in enumerate(self.worlds):
+            for spr in world.bombs_group.sprites() + \
+                    world.actors_group.sprites():
+                channel = ENEMIES
+                if isinstance(spr, main.Bomb):
+                    channel = BOMBS
+                elif spr is world.player:
+                    channel = PLAYER
+                column, row = main.get_cell(spr.rect.centerx,
+                                            spr.rect.centery)
+                cells[0].append(index)
+                cells[1].append(channel)
+                cells[2].append(row)
+                cells[3].append(column)
+            for column, row in main.make_blast_map(world.explosions_group):
+                cells[0].append(index)
+                cells[1].append(BLASTS)
+                cells[2].append(row)
+                cells[3].append(column)
+        games, channels, cells_rows, cells_columns = map(np.array, cells)
+        # pushed by collisions actors may pass through the outer walls
+        inside = (cells_rows >= 0) & (cells_rows < rows) & \
+            (cells_columns >= 0) & (cells_columns < columns)
+        observations[games[inside], channels[inside],
+                     cells_rows[inside], cells_columns[inside]] = 1
+        return observations